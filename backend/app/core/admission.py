@@ -0,0 +1,164 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+
+class AdmissionLane:
+    """
+    A concurrency lane: at most `max_concurrency` requests run at once, at most
+    `max_queue` more wait (each for up to `queue_timeout` seconds). Anything beyond
+    that is rejected immediately so callers can back off instead of piling up.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    async def acquire(self) -> Optional[int]:
+        """
+        Wait for a slot. Returns None once admitted, otherwise the HTTP status to
+        reject with: 429 when the wait queue is full, 503 when the wait timed out.
+        """
+        if not self._semaphore.locked():
+            # A slot is free: acquire() returns without suspending
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            return 429
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                return 503
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+def _lane_from_env(name: str, concurrency: int, queue: int, timeout: float) -> AdmissionLane:
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdmissionLane(
+        name=name,
+        max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", queue)),
+        queue_timeout=float(os.getenv(f"{prefix}_TIMEOUT", timeout)),
+        retry_after=int(os.getenv("ADMISSION_RETRY_AFTER", 2)),
+    )
+
+
+# Interactive chat, uploads and bulk batch queries get separate lanes so
+# ingestion or evaluation bursts cannot starve chat.
+LANES: Dict[str, AdmissionLane] = {
+    "chat": _lane_from_env("chat", concurrency=16, queue=64, timeout=10),
+    "upload": _lane_from_env("upload", concurrency=2, queue=8, timeout=30),
+    "batch": _lane_from_env("batch", concurrency=1, queue=4, timeout=30),
+}
+
+# (method, path, is_prefix, lane); anything unmatched (history, folders, health) is not limited
+ADMISSION_ROUTES: List[Tuple[str, str, bool, str]] = [
+    ("POST", "/api/chat/", False, "chat"),
+    ("POST", "/api/chat/transcribe", False, "chat"),
+    ("POST", "/api/chat/batch", False, "batch"),
+    ("POST", "/api/upload/", True, "upload"),
+]
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the lanes above. The slot is held until the response
+    has been fully sent, so streaming responses are covered too.
+    """
+
+    def __init__(self, app, lanes: Dict[str, AdmissionLane] = None, routes: List[Tuple[str, str, bool, str]] = None):
+        self.app = app
+        self.lanes = LANES if lanes is None else lanes
+        self.routes = ADMISSION_ROUTES if routes is None else routes
+
+    def _match(self, method: str, path: str) -> Optional[AdmissionLane]:
+        for route_method, route_path, is_prefix, lane in self.routes:
+            if method != route_method:
+                continue
+            if path == route_path or (is_prefix and path.startswith(route_path)):
+                return self.lanes.get(lane)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        lane = self._match(scope["method"], scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = await lane.acquire()
+        if status is not None:
+            detail = "Too many requests queued" if status == 429 else "Timed out waiting for capacity"
+            response = JSONResponse(
+                {"detail": f"{detail} on the '{lane.name}' lane, retry later."},
+                status_code=status,
+                headers={"Retry-After": str(lane.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release()
+
+
+def upstream_status(error: BaseException) -> Optional[int]:
+    """
+    Status to answer with when a request failed on an upstream service (Gemini,
+    Qdrant): 429 when it was rate limited, 503 for other upstream errors and
+    connection failures, None when the error did not come from upstream. Client
+    wrappers chain the original error, so the whole cause chain is checked.
+    """
+    status = None
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        code = getattr(error, "code", None)
+        if not isinstance(code, int):
+            code = getattr(error, "status_code", None)
+        if code == 429:
+            return 429
+        if isinstance(code, int) or isinstance(error, (ConnectionError, TimeoutError)) or \
+                type(error).__module__.split(".")[0] in ("httpx", "httpcore", "qdrant_client", "google"):
+            status = 503
+        error = error.__cause__ or error.__context__
+    return status
+
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: lane.stats() for name, lane in LANES.items()}
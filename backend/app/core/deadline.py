@@ -0,0 +1,228 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# End-to-end deadline for a chat answer (0 disables), and the share of it each
+# stage may use; generation gets whatever is left after holding back the store budget
+CHAT_DEADLINE_MS = int(os.getenv("CHAT_DEADLINE_MS", 30000))
+STAGE_BUDGETS_MS = {
+    "embed": int(os.getenv("CHAT_EMBED_BUDGET_MS", 3000)),
+    "search": int(os.getenv("CHAT_SEARCH_BUDGET_MS", 2000)),
+    "store": int(os.getenv("CHAT_STORE_BUDGET_MS", 2000)),
+}
+
+# Stages run on their own bounded pool rather than the shared threadpool: a call
+# abandoned at its deadline keeps its thread until the client timeout ends it, and
+# must not starve uploads or health checks. When every worker is busy, stages fail
+# fast with StageRejected instead of queueing.
+STAGE_WORKERS = int(os.getenv("CHAT_STAGE_WORKERS", 32))
+_EXECUTOR = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="chat-stage")
+_busy_lock = threading.Lock()
+_busy_workers = 0
+
+# Hedging: when a stage call is slower than the recent HEDGE_PERCENTILE latency,
+# fire a second identical call and take whichever finishes first
+HEDGE_ENABLED = os.getenv("CHAT_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("CHAT_HEDGE_PERCENTILE", 95))
+# No hedging until a stage has this many latency samples to base the delay on
+HEDGE_MIN_SAMPLES = int(os.getenv("CHAT_HEDGE_MIN_SAMPLES", 20))
+HEDGE_WINDOW = 512
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage: str, timeout: Optional[float], message: Optional[str] = None):
+        if message is None:
+            message = f"Stage '{stage}' did not finish within {timeout:.2f}s" if timeout else f"Stage '{stage}' ran out of time"
+        super().__init__(message)
+        self.stage = stage
+
+
+class StageRejected(StageTimeout):
+    """
+    No free stage worker; degrades like a timeout, but without waiting.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(stage, None, f"Stage '{stage}' rejected: all {STAGE_WORKERS} stage workers are busy")
+
+
+def stage_budget(name: str) -> Optional[float]:
+    """
+    A stage's own budget in seconds, None if it has none.
+    """
+    budget_ms = STAGE_BUDGETS_MS.get(name, 0)
+    return budget_ms / 1000 if budget_ms > 0 else None
+
+
+def client_timeout(name: str) -> Optional[float]:
+    """
+    Timeout for the network client behind a stage, so a call abandoned at the
+    deadline also ends on its own: the stage budget, or the whole deadline for
+    stages without one (generation). None when neither is set.
+    """
+    budget = stage_budget(name)
+    if budget is not None:
+        return budget
+    return CHAT_DEADLINE_MS / 1000 if CHAT_DEADLINE_MS > 0 else None
+
+
+class Deadline:
+    """
+    An end-to-end time budget; stages ask it how long they may take.
+    A total of None or <= 0 means no deadline.
+    """
+
+    def __init__(self, total: Optional[float]):
+        self.total = total if total and total > 0 else None
+        self.expires_at = time.monotonic() + self.total if self.total else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, stage_budget: Optional[float] = None, reserve: Optional[float] = None) -> Optional[float]:
+        """
+        Timeout for the next stage: its own budget, capped by what is left overall
+        after holding back `reserve` seconds for later stages.
+        """
+        remaining = self.remaining()
+        if remaining is not None and reserve:
+            remaining = max(0.0, remaining - reserve)
+        if stage_budget is None or stage_budget <= 0:
+            return remaining
+        return stage_budget if remaining is None else min(stage_budget, remaining)
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.latencies = deque(maxlen=HEDGE_WINDOW)
+
+    def hedge_delay(self) -> Optional[float]:
+        # Nearest-rank percentile over the recent window
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(HEDGE_PERCENTILE / 100 * len(ordered)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
+
+
+STAGES: Dict[str, StageStats] = {}
+
+
+def _stage(name: str) -> StageStats:
+    if name not in STAGES:
+        STAGES[name] = StageStats(name)
+    return STAGES[name]
+
+
+def _release_worker(_):
+    global _busy_workers
+    with _busy_lock:
+        _busy_workers -= 1
+
+
+def _attempt(stats: StageStats, fn: Callable, args) -> Optional["asyncio.Future"]:
+    """
+    Start fn(*args) on a stage worker; None when all of them are busy. A worker is
+    released when its call really ends, not when the caller stops waiting.
+    """
+    global _busy_workers
+    with _busy_lock:
+        if _busy_workers >= STAGE_WORKERS:
+            return None
+        _busy_workers += 1
+    started = time.perf_counter()
+    future = _EXECUTOR.submit(fn, *args)
+    future.add_done_callback(_release_worker)
+    task = asyncio.wrap_future(future)
+
+    def finished(task):
+        # Late results of abandoned attempts still count, so the percentile sees the
+        # real tail; exceptions are consumed here so they are never "unretrieved"
+        if not task.cancelled() and task.exception() is None:
+            stats.latencies.append(time.perf_counter() - started)
+
+    task.add_done_callback(finished)
+    return task
+
+
+async def call_stage(name: str, fn: Callable, *args, timeout: Optional[float] = None, hedge: bool = False):
+    """
+    Run the blocking fn(*args) on a stage worker within `timeout` seconds, raising
+    StageTimeout when it does not finish in time and StageRejected when no worker
+    is free. With hedge=True (for idempotent calls only) and CHAT_HEDGE=1, a second
+    call is started once the first has taken longer than the stage's recent
+    percentile latency; the first success wins.
+    Threads cannot be interrupted: a timed-out or losing call keeps its worker
+    until the underlying client times out (see client_timeout), but nobody waits for it.
+    """
+    stats = _stage(name)
+    stats.calls += 1
+    if timeout is not None and timeout <= 0:
+        # Out of budget already: do not start work nobody will wait for
+        stats.timeouts += 1
+        raise StageTimeout(name, timeout)
+    delay = stats.hedge_delay() if hedge and HEDGE_ENABLED else None
+    started = time.monotonic()
+    primary = _attempt(stats, fn, args)
+    if primary is None:
+        stats.rejected += 1
+        raise StageRejected(name)
+    pending = {primary}
+    hedged = False
+    error = None
+    while pending:
+        elapsed = time.monotonic() - started
+        wait = None if timeout is None else timeout - elapsed
+        if wait is not None and wait <= 0:
+            break
+        if delay is not None and not hedged:
+            wait = delay - elapsed if wait is None else min(wait, delay - elapsed)
+        done, pending = await asyncio.wait(pending, timeout=max(wait, 0) if wait is not None else None,
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                if task is not primary:
+                    stats.hedge_wins += 1
+                return task.result()
+            error = task.exception()
+        if delay is not None and not hedged and pending and time.monotonic() - started >= delay:
+            # No free worker for the hedge: keep waiting on the first call alone
+            hedged = True
+            hedge = _attempt(stats, fn, args)
+            if hedge is not None:
+                stats.hedged += 1
+                pending.add(hedge)
+    if not pending and error is not None:
+        stats.errors += 1
+        raise error
+    stats.timeouts += 1
+    raise StageTimeout(name, timeout)
+
+
+def stage_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: stats.stats() for name, stats in STAGES.items()}
@@ -1,33 +1,130 @@
+import math
 import os
-from typing import List
+from typing import List, Optional
+from google.genai.types import HttpOptions
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+# Native output size per model, and the models trained Matryoshka-style (their
+# leading dimensions are a usable embedding on their own once renormalized)
+NATIVE_DIMS = {
+    "gemini-embedding-001": 3072,
+    "text-embedding-004": 768,
+    "embedding-001": 768,
+}
+MATRYOSHKA_MODELS = {"gemini-embedding-001", "text-embedding-004"}
+
+class EmbeddingDimMismatch(ValueError):
+    """
+    A stored collection holds vectors of another size than EMBEDDING_DIM. Its
+    vectors cannot be searched or diffed against, and recreating it would drop
+    every document, so nothing is done until the operator decides.
+    """
+
+    def __init__(self, collection: str, stored: int, configured: int):
+        super().__init__(
+            f"Collection '{collection}' stores {stored}-d vectors but EMBEDDING_DIM is {configured}. "
+            f"Set EMBEDDING_DIM={stored} to keep using it, or delete the collection and re-ingest "
+            f"its documents to switch sizes."
+        )
+        self.collection = collection
+        self.stored = stored
+        self.configured = configured
+
+def _base_model_name(model_name: str) -> str:
+    return model_name.split("/")[-1]
+
+def configured_embedding_dim(model_name: Optional[str] = None) -> int:
+    """
+    Vector size used for storage: EMBEDDING_DIM if set, else the model's native size.
+    Collections are created and checked against this value, so an unknown model
+    without EMBEDDING_DIM is a configuration error rather than a guess.
+    """
+    model_name = model_name or os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+    native_dim = NATIVE_DIMS.get(_base_model_name(model_name))
+    if os.getenv("EMBEDDING_DIM"):
+        return _check_output_dim(model_name, int(os.getenv("EMBEDDING_DIM")), native_dim)
+    if native_dim is None:
+        raise ValueError(f"Unknown output size for embedding model {model_name}; set EMBEDDING_DIM.")
+    return native_dim
+
+def _check_output_dim(model_name: str, output_dim: int, native_dim: Optional[int]) -> int:
+    # The API cannot pad vectors beyond the model's native size
+    if output_dim <= 0:
+        raise ValueError(f"Embedding size must be positive, got {output_dim}.")
+    if native_dim is not None and output_dim > native_dim:
+        raise ValueError(f"Embedding size {output_dim} exceeds the {native_dim} dimensions model {model_name} produces.")
+    return output_dim
+
+def truncate_and_normalize(vector: List[float], dim: int) -> List[float]:
+    head = vector[:dim]
+    norm = math.sqrt(sum(x * x for x in head))
+    return [x / norm for x in head] if norm else head
+
+class _TimeoutEmbeddings(GoogleGenerativeAIEmbeddings):
+    """
+    GoogleGenerativeAIEmbeddings with a per-request HTTP timeout in seconds. The
+    wrapper's request_options never reaches the google-genai client, which
+    otherwise waits on a hung request forever.
+    """
+
+    timeout: Optional[float] = None
+
+    def _build_config(self, **kwargs):
+        config = super()._build_config(**kwargs)
+        if self.timeout:
+            config.http_options = HttpOptions(timeout=int(self.timeout * 1000))
+        return config
+
 class Embedder:
     """
     Wrapper around Google Gemini Embedding API using LangChain.
     Default model: 'models/embedding-001' (LangChain expects 'models/' prefix often, or just 'embedding-001').
+    Set EMBEDDING_DIM to store smaller vectors; this needs a Matryoshka-trained model.
+    `timeout` (seconds) bounds each API request.
     """
 
-    def __init__(self, model_name: str = "models/embedding-001"):
+    def __init__(self, model_name: str = "models/embedding-001", output_dim: Optional[int] = None, timeout: Optional[float] = None):
         self.model_name = model_name
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set.")
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=api_key)
+        self.embeddings = _TimeoutEmbeddings(model=model_name, google_api_key=api_key, timeout=timeout)
+
+        base_name = _base_model_name(model_name)
+        native_dim = NATIVE_DIMS.get(base_name)
+        self.output_dim = _check_output_dim(model_name, output_dim, native_dim) if output_dim else configured_embedding_dim(model_name)
+        self.reduced = native_dim is not None and self.output_dim < native_dim
+        if self.reduced and base_name not in MATRYOSHKA_MODELS:
+            raise ValueError(f"Model {model_name} does not support reduced output dimensionality ({self.output_dim}).")
 
     @property
     def embedding_dim(self) -> int:
-        # gemini-embedding-001 has 768 dimensions
-        return 768
+        return self.output_dim
+
+    def _reduce(self, vectors: List[List[float]]) -> List[List[float]]:
+        # The API truncates when asked for fewer dimensions but does not renormalize
+        if not self.reduced:
+            return vectors
+        return [truncate_and_normalize(v, self.output_dim) for v in vectors]
+
+    def _dim_kwargs(self):
+        return {"output_dimensionality": self.output_dim} if self.reduced else {}
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """
         Embed a list of texts -> returns list of vector lists.
         """
-        return self.embeddings.embed_documents(texts)
+        return self._reduce(self.embeddings.embed_documents(texts, **self._dim_kwargs()))
 
     def embed_query(self, text: str) -> List[float]:
         """
         Embed a single query -> returns a single vector list.
         """
-        return self.embeddings.embed_query(text)
\ No newline at end of file
+        return self._reduce([self.embeddings.embed_query(text, **self._dim_kwargs())])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many queries in one batched call -> returns list of vector lists.
+        Uses the query task type so vectors match embed_query.
+        """
+        return self._reduce(self.embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY", **self._dim_kwargs()))
@@ -1,22 +1,146 @@
-from typing import List
-
-def split_text_into_chunks(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:
-    """
-    Simple character-based text splitter.
-    Splits long text into overlapping chunks to be embedded.
-    """
-    text = text.replace("\r", "\n")
-    if not text:
-        return []
-    chunks = []
-    start = 0
-    text_len = len(text)
-    while start < text_len:
-        end = start + chunk_size
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start = end - chunk_overlap
-        if start < 0:
-            start = 0
-    return chunks
\ No newline at end of file
+import re
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from operator import sub
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Segment boundaries in priority order: paragraph break, sentence end, line break.
+# Every alternative starts with one of [.!?\n] so the scanner can skip ahead on a
+# single character class instead of trying a lookbehind at every position.
+_BOUNDARY = re.compile(r"[.!?\n](?:(?<=\n)[ \t\r\f\v]*\n\s*|(?<=\n)|(?<=[.!?])[\"')\]]*\s+)")
+_WORD = re.compile(r"\S+\s*")
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+
+class Chunk(NamedTuple):
+    """
+    A chunk of text plus where it came from: `page` is the page number given by
+    the caller (None for plain text), `start`/`end` are character offsets of the
+    chunk within that page, `index` is the running position across the stream.
+    """
+    text: str
+    index: int
+    page: Optional[int]
+    start: int
+    end: int
+
+
+def _split_long(text: str, start: int, end: int, chunk_size: int, unit: str) -> List[int]:
+    """
+    End offsets of pieces no larger than chunk_size for a sentence that is too long
+    on its own: word boundaries first, hard cuts for over-long "words" (char mode).
+    """
+    ends = []
+    piece_start, piece_size = start, 0
+    for word in _WORD.finditer(text, start, end):
+        word_size = 1 if unit == "token" else word.end() - word.start()
+        if piece_size and piece_size + word_size > chunk_size:
+            ends.append(word.start())
+            piece_start, piece_size = word.start(), 0
+        if word_size > chunk_size:
+            if word.start() > piece_start:
+                ends.append(word.start())
+            ends.extend(range(word.start() + chunk_size, word.end(), chunk_size))
+            ends.append(word.end())
+            piece_start, piece_size = word.end(), 0
+            continue
+        piece_size += word_size
+    if piece_start < end:
+        ends.append(end)
+    return ends
+
+
+def _boundaries(text: str, chunk_size: int, unit: str) -> Tuple[List[int], List[int]]:
+    """
+    Segment boundaries (offsets, starting at 0 and ending at len(text)) with the
+    cumulative size in `unit` at each one; no two neighbours are more than
+    chunk_size apart. Sizes are cumulative so a chunk's extent is one bisect away.
+    """
+    bounds = [0]
+    bounds.extend(match.end() for match in _BOUNDARY.finditer(text))
+    if bounds[-1] < len(text):
+        bounds.append(len(text))
+    sizes = _cumulative_sizes(text, bounds, unit)
+    if len(bounds) > 1 and max(map(sub, sizes[1:], sizes[:-1])) > chunk_size:
+        refined = [0]
+        for prev, offset, prev_size, size in zip(bounds, bounds[1:], sizes, sizes[1:]):
+            if size - prev_size > chunk_size:
+                refined.extend(_split_long(text, prev, offset, chunk_size, unit))
+            else:
+                refined.append(offset)
+        bounds = refined
+        sizes = _cumulative_sizes(text, bounds, unit)
+    return bounds, sizes
+
+
+def _cumulative_sizes(text: str, bounds: List[int], unit: str) -> List[int]:
+    if unit == "char":
+        return bounds
+    return [0, *accumulate(len(text[start:end].split()) for start, end in zip(bounds, bounds[1:]))]
+
+
+def iter_page_chunks(
+    pages: Iterable[Tuple[str, Optional[int]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    unit: str = "char",
+) -> Iterator[Chunk]:
+    """
+    Split a stream of (page_text, page_number) pairs into overlapping chunks in a
+    single linear pass. Chunks are packed from whole sentences/paragraphs and never
+    span two pages. `unit` is "char" or "token" (whitespace-delimited words) and
+    applies to both chunk_size and chunk_overlap.
+    """
+    if unit not in ("char", "token"):
+        raise ValueError(f"Unknown split unit: {unit}")
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be >= 0 and smaller than chunk_size.")
+
+    index = 0
+    for text, page in pages:
+        if not text:
+            continue
+        bounds, sizes = _boundaries(text, chunk_size, unit)
+        last = len(bounds) - 1
+        first = 0
+        while first < last:
+            # Greedily take whole segments up to chunk_size
+            end = bisect_right(sizes, sizes[first] + chunk_size, first + 1) - 1
+            raw = text[bounds[first]:bounds[end]]
+            stripped = raw.strip()
+            if stripped:
+                offset = bounds[first] + len(raw) - len(raw.lstrip())
+                yield Chunk(stripped, index, page, offset, offset + len(stripped))
+                index += 1
+            if end == last:
+                break
+            # Next chunk starts at the earliest boundary that leaves at most
+            # chunk_overlap of tail and still fits the following segment
+            floor = max(sizes[end] - chunk_overlap, sizes[end + 1] - chunk_size)
+            first = bisect_left(sizes, floor, first + 1, end)
+
+
+def iter_text_chunks(
+    text: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    unit: str = "char",
+) -> Iterator[Chunk]:
+    """
+    Split a single text (e.g. a transcript) into chunks; see iter_page_chunks.
+    """
+    return iter_page_chunks([(text.replace("\r\n", "\n").replace("\r", "\n"), None)], chunk_size, chunk_overlap, unit)
+
+
+def split_text_into_chunks(
+    text: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    unit: str = "char",
+) -> List[str]:
+    """
+    Sentence-aware text splitter returning only the chunk texts.
+    """
+    return [chunk.text for chunk in iter_text_chunks(text, chunk_size, chunk_overlap, unit)]
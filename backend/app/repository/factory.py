@@ -0,0 +1,23 @@
+import os
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+_REPOSITORY = None
+
+def get_repository():
+    """
+    Process-wide vector repository, shared by the chat and ingestion services.
+    VECTOR_BACKEND=qdrant (default) talks to the Qdrant server; VECTOR_BACKEND=local
+    uses the embedded index in app/repository/local_repo.py.
+    """
+    global _REPOSITORY
+    if _REPOSITORY is None:
+        if VECTOR_BACKEND == "qdrant":
+            from app.repository.qdrant_repo import QdrantRepository
+            _REPOSITORY = QdrantRepository()
+        elif VECTOR_BACKEND == "local":
+            from app.repository.local_repo import LocalVectorRepository
+            _REPOSITORY = LocalVectorRepository()
+        else:
+            raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+    return _REPOSITORY
@@ -0,0 +1,526 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.embeddings import EmbeddingDimMismatch, configured_embedding_dim
+
+try:
+    import hnswlib
+except ImportError:  # optional: brute-force BLAS search is used without it
+    hnswlib = None
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./local_index")
+LOCAL_INDEX_HNSW = os.getenv("LOCAL_INDEX_HNSW", "0") == "1"
+# Below this many vectors brute force is faster than maintaining a graph
+LOCAL_INDEX_HNSW_MIN = int(os.getenv("LOCAL_INDEX_HNSW_MIN", 20000))
+VECTOR_DATATYPE = os.getenv("VECTOR_DATATYPE", "float32")
+# Chunk payload fields that describe where the chunk sits in its source (as in qdrant_repo)
+POSITION_KEYS = ("chunk_index", "start", "end", "page")
+
+# On-disk element type and file suffix per datatype. uint8 is stored as int8 so
+# normalized vectors keep their sign and cosine stays a dot product.
+_DTYPES = {"float32": (np.float32, "f32"), "float16": (np.float16, "f16"), "uint8": (np.int8, "i8")}
+# Components of a unit vector have std ~1/sqrt(dim); int8 covers +-8 std of that
+# and clips the rare outliers, instead of spending the range on [-1, 1]
+_INT8_SIGMAS = 8.0
+# Rows scored per step in brute-force search: bounds the float32 score buffer to
+# queries x _SCORE_BLOCK however large the collection is
+_SCORE_BLOCK = 16384
+
+
+class LocalCollection:
+    """
+    One collection stored on disk as a memory-mapped matrix (`vectors.f32`, or
+    `.f16`/`.i8` for reduced precision; rows L2-normalized so cosine similarity is
+    a dot product) plus a SQLite table with the row -> id/payload mapping
+    (`points.db`), written row by row so a write costs O(points touched).
+    Deleted rows are recycled.
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, use_hnsw: bool = False, datatype: str = "float32"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._points_path = os.path.join(path, "points.db")
+        self.ids: List[Optional[str]] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self.dim = dim
+        self.datatype = datatype
+        self.use_hnsw = use_hnsw and hnswlib is not None
+        self._hnsw = None
+        self._matrix = None
+        if not self.exists(path) and dim is None:
+            raise ValueError(f"Collection at {path} does not exist and no vector size given.")
+        os.makedirs(path, exist_ok=True)
+        self._db = self._connect()
+        self._load()
+        if self.datatype not in _DTYPES:
+            raise ValueError(f"Unsupported vector datatype: {self.datatype}")
+        self._dtype, suffix = _DTYPES[self.datatype]
+        self._vectors_path = os.path.join(path, f"vectors.{suffix}")
+        self._int8_scale = 127.0 * np.sqrt(self.dim) / _INT8_SIGMAS
+        self._alive = np.array([i is not None for i in self.ids], dtype=bool)
+        self._open_matrix(max(len(self.ids), 1024))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "points.db")) or os.path.exists(os.path.join(path, "points.json"))
+
+    # --- storage ---
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._points_path, check_same_thread=False)  # guarded by self._lock
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT NOT NULL, payload TEXT)")
+        return db
+
+    def _load(self):
+        legacy_path = os.path.join(self.path, "points.json")
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if not meta and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path)
+            meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if meta:
+            self.dim = int(meta["dim"])
+            self.datatype = meta["datatype"]
+        else:
+            with self._db:
+                self._db.executemany("INSERT INTO meta VALUES (?, ?)", [("dim", str(self.dim)), ("datatype", self.datatype)])
+        for row, point_id, payload in self._db.execute("SELECT row, id, payload FROM points ORDER BY row"):
+            if row >= len(self.ids):
+                self.ids.extend([None] * (row + 1 - len(self.ids)))
+                self.payloads.extend([None] * (row + 1 - len(self.payloads)))
+            self.ids[row] = point_id
+            self.payloads[row] = json.loads(payload)
+        self.id_to_row = {point_id: row for row, point_id in enumerate(self.ids) if point_id is not None}
+        self.free_rows = [row for row, point_id in enumerate(self.ids) if point_id is None]
+
+    def _import_legacy(self, legacy_path: str):
+        # One-off migration from the single points.json file of earlier versions
+        with open(legacy_path) as f:
+            data = json.load(f)
+        with self._db:
+            self._db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("dim", str(data["dim"])), ("datatype", data.get("datatype", "float32"))
+            ])
+            self._db.executemany("INSERT INTO points VALUES (?, ?, ?)", [
+                (row, point_id, json.dumps(payload))
+                for row, (point_id, payload) in enumerate(zip(data["ids"], data["payloads"])) if point_id is not None
+            ])
+        os.remove(legacy_path)
+
+    def _open_matrix(self, capacity: int):
+        row_bytes = self.dim * np.dtype(self._dtype).itemsize
+        current = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = max(capacity, current // row_bytes)
+        if current < capacity * row_bytes:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = np.memmap(self._vectors_path, dtype=self._dtype, mode="r+", shape=(capacity, self.dim))
+
+    def _write_rows(self, rows: Sequence[int]):
+        # Vectors first, then the mapping rows that reference them (one transaction)
+        self._matrix.flush()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points VALUES (?, ?, ?)",
+                [(int(row), self.ids[row], json.dumps(self.payloads[row])) for row in rows],
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+            self._matrix.flush()
+
+    def _delete_rows(self, rows: Sequence[int]):
+        with self._db:
+            self._db.executemany("DELETE FROM points WHERE row = ?", [(int(row),) for row in rows])
+
+    # --- mutation ---
+    def upsert(self, ids: Sequence[str], vectors, payloads: Sequence[Dict[str, Any]]):
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"Vector size {matrix.shape[1]} does not match collection size {self.dim}.")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        with self._lock:
+            rows = []
+            for point_id, payload in zip(ids, payloads):
+                point_id = str(point_id)
+                row = self.id_to_row.get(point_id)
+                if row is None:
+                    row = self.free_rows.pop() if self.free_rows else len(self.ids)
+                    if row == len(self.ids):
+                        self.ids.append(None)
+                        self.payloads.append(None)
+                    self.ids[row] = point_id
+                    self.id_to_row[point_id] = row
+                self.payloads[row] = payload
+                rows.append(row)
+            if len(self.ids) > self._matrix.shape[0]:
+                self._open_matrix(max(len(self.ids), self._matrix.shape[0] * 2))
+            if len(self.ids) > len(self._alive):
+                self._alive = np.concatenate([self._alive, np.zeros(len(self.ids) - len(self._alive), dtype=bool)])
+            rows = np.asarray(rows)
+            self._matrix[rows] = self._encode(matrix)
+            self._alive[rows] = True
+            if self._hnsw is not None:
+                if len(self.ids) > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(self._matrix.shape[0])
+                self._hnsw.add_items(matrix, rows)
+            self._write_rows(rows)
+
+    def delete(self, ids: Sequence[str]) -> int:
+        with self._lock:
+            deleted = []
+            for point_id in ids:
+                row = self.id_to_row.pop(str(point_id), None)
+                if row is None:
+                    continue
+                self.ids[row] = None
+                self.payloads[row] = None
+                self._alive[row] = False
+                self._matrix[row] = 0.0
+                self.free_rows.append(row)
+                if self._hnsw is not None:
+                    self._hnsw.mark_deleted(row)
+                deleted.append(row)
+            if deleted:
+                self._delete_rows(deleted)
+            return len(deleted)
+
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]]):
+        # Merge fields into the payloads of existing points; unknown ids are skipped
+        with self._lock:
+            rows = []
+            for point_id, fields in payloads.items():
+                row = self.id_to_row.get(str(point_id))
+                if row is not None:
+                    self.payloads[row] = {**self.payloads[row], **fields}
+                    rows.append(row)
+            self._write_rows(rows)
+
+    # --- precision ---
+    def _encode(self, matrix: np.ndarray) -> np.ndarray:
+        if self.datatype == "uint8":
+            return np.clip(np.round(matrix * self._int8_scale), -127, 127).astype(np.int8)
+        return matrix.astype(self._dtype)
+
+    def _decode(self, stored: np.ndarray) -> np.ndarray:
+        if self.datatype == "uint8":
+            return stored.astype(np.float32) / self._int8_scale
+        return stored.astype(np.float32, copy=False)
+
+    def _brute_force_top_k(self, queries: np.ndarray, matrix: np.ndarray, alive: np.ndarray, k: int):
+        """
+        Exact top-k per query -> (rows, scores) arrays of shape (queries, k), best first.
+        Scores one block of rows at a time (one BLAS call per block for the whole query
+        batch) and merges each block's top-k into the running result.
+        """
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK):
+            block_alive = alive[start:start + _SCORE_BLOCK]
+            if not block_alive.any():
+                continue
+            scores = queries @ self._decode(matrix[start:start + _SCORE_BLOCK]).T
+            scores[:, ~block_alive] = -np.inf
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, best_scores.shape[1] - k, axis=1)[:, -k:]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    # --- queries ---
+    def find(self, key: str, value: Any) -> List[int]:
+        with self._lock:
+            return [row for row, payload in enumerate(self.payloads) if payload is not None and payload.get(key) == value]
+
+    def count(self) -> int:
+        return len(self.id_to_row)
+
+    def _ensure_hnsw(self):
+        if not self.use_hnsw or self._hnsw is not None or self.count() < LOCAL_INDEX_HNSW_MIN:
+            return
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=self._matrix.shape[0], ef_construction=200, M=16)
+        rows = np.flatnonzero(self._alive)
+        index.add_items(self._decode(self._matrix[rows]), rows)
+        index.set_ef(128)
+        self._hnsw = index
+
+    def search(self, queries, limit: int) -> List[List[Tuple[int, float]]]:
+        """
+        Cosine top-k for a batch of query vectors -> per query a list of (row, score).
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._ensure_hnsw()
+            size = len(self.ids)
+            alive_count = self.count()
+            k = min(limit, alive_count)
+            if k == 0:
+                return [[] for _ in range(len(queries))]
+            if self._hnsw is not None:
+                # hnswlib queries must not race with add_items/mark_deleted
+                labels, distances = self._hnsw.knn_query(queries, k=k)
+                # "ip" space returns 1 - dot product
+                return [[(int(r), float(1.0 - d)) for r, d in zip(row_labels, row_dist)]
+                        for row_labels, row_dist in zip(labels, distances)]
+            matrix, alive = self._matrix[:size], self._alive[:size]
+        rows, scores = self._brute_force_top_k(queries, matrix, alive, k)
+        return [[(int(r), float(score)) for r, score in zip(query_rows, query_scores) if score != -np.inf]
+                for query_rows, query_scores in zip(rows, scores)]
+
+    def points(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"row": r, "id": self.ids[r], "payload": self.payloads[r]} for r in rows if self.ids[r] is not None]
+
+    def all_rows(self) -> List[int]:
+        with self._lock:
+            return [row for row, point_id in enumerate(self.ids) if point_id is not None]
+
+
+class LocalVectorRepository:
+    """
+    In-process replacement for QdrantRepository with the same methods, for edge
+    and small deployments where the corpus fits in RAM. Select it with
+    VECTOR_BACKEND=local; data lives under LOCAL_INDEX_PATH.
+    """
+
+    def __init__(self, path: str = LOCAL_INDEX_PATH, use_hnsw: bool = LOCAL_INDEX_HNSW):
+        self.path = path
+        self.use_hnsw = use_hnsw
+        self.doc_collection = "documents"
+        self.chat_collection = "chats" # Stores individual messages
+        self.conversation_collection = "conversations" # Stores conversation metadata
+        self.folder_collection = "folders" # Stores folder metadata
+        self.vector_size = configured_embedding_dim()
+        self.vector_datatype = VECTOR_DATATYPE
+        self._collections: Dict[str, LocalCollection] = {}
+        self._datatype_warned = set()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _collection(self, name: str, dim: Optional[int] = None, datatype: str = "float32") -> Optional[LocalCollection]:
+        # Open an existing collection, or create it when a vector size is given
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection_path = os.path.join(self.path, name)
+                if not LocalCollection.exists(collection_path) and dim is None:
+                    return None
+                collection = LocalCollection(collection_path, dim=dim, use_hnsw=self.use_hnsw, datatype=datatype)
+                self._collections[name] = collection
+            return collection
+
+    def _vector_collection(self, name: str, vectors: List[List[float]]) -> LocalCollection:
+        # Sized from the configured embedding dimension, as in QdrantRepository
+        if any(len(v) != self.vector_size for v in vectors):
+            raise ValueError(f"Vector size {len(vectors[0])} does not match configured EMBEDDING_DIM {self.vector_size}.")
+        collection = self._collection(name, self.vector_size, self.vector_datatype)
+        self._check_dim(name, collection)
+        if collection.datatype != self.vector_datatype and name not in self._datatype_warned:
+            # Converting would rewrite every vector; leave that to an explicit re-ingest
+            self._datatype_warned.add(name)
+            print(f"WARNING: local collection {name} stores {collection.datatype} vectors but VECTOR_DATATYPE is "
+                  f"{self.vector_datatype}; drop and re-ingest it to change storage type")
+        return collection
+
+    def _check_dim(self, name: str, collection: Optional[LocalCollection]):
+        # Never recreate on a size change: that would silently drop every document
+        if collection is not None and collection.dim != self.vector_size:
+            raise EmbeddingDimMismatch(name, collection.dim, self.vector_size)
+
+    def verify_vector_collections(self):
+        """
+        Startup check: raise EmbeddingDimMismatch if an existing collection was
+        built with another EMBEDDING_DIM.
+        """
+        for name in (self.doc_collection, self.chat_collection):
+            self._check_dim(name, self._collection(name))
+
+    def _drop_collection(self, name: str):
+        import shutil
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def set_collection_vector_size(self, collection_name: str, vector_size: int, datatype: str = None):
+        # Same semantics as Qdrant: drop and recreate with the new size
+        self._drop_collection(collection_name)
+        self._collection(collection_name, vector_size, datatype or self.vector_datatype)
+
+    def upsert_documents(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
+        if len(vectors) == 0:
+            return
+        collection = self._vector_collection(self.doc_collection, vectors)
+        collection.upsert(ids, vectors, payloads)
+        print(f"DEBUG: Upserted {len(ids)} points to local {self.doc_collection}")
+
+    def get_document_ids(self, source: str) -> List[str]:
+        return list(self.get_document_positions(source))
+
+    def get_document_positions(self, source: str) -> Dict[str, Dict[str, Any]]:
+        collection = self._collection(self.doc_collection)
+        if collection is None:
+            return {}
+        # Chunks stored at another vector size are not "unchanged"
+        self._check_dim(self.doc_collection, collection)
+        return {
+            point["id"]: {key: point["payload"][key] for key in POSITION_KEYS if key in point["payload"]}
+            for point in collection.points(collection.find("source", source))
+        }
+
+    def update_document_payloads(self, payloads: Dict[str, Dict[str, Any]]):
+        collection = self._collection(self.doc_collection)
+        if collection is None or not payloads:
+            return
+        collection.set_payloads(payloads)
+
+    def delete_documents(self, ids: List[str]):
+        collection = self._collection(self.doc_collection)
+        if collection is None or not ids:
+            return
+        collection.delete(ids)
+
+    def delete_document_source(self, source: str) -> int:
+        ids = self.get_document_ids(source)
+        self.delete_documents(ids)
+        return len(ids)
+
+    def search(self, collection_name: str, vector: List[float], limit: int = 5, with_payload: bool = True):
+        return self.search_batch(collection_name, [vector], limit, with_payload)[0]
+
+    def search_batch(self, collection_name: str, vectors: List[List[float]], limit: int = 5, with_payload: bool = True):
+        collection = self._collection(collection_name)
+        if collection is None or len(vectors) == 0:
+            return [[] for _ in vectors]
+        # Unlike search(), failures raise: batch callers must not mistake them for no hits
+        batches = collection.search(vectors, limit)
+        results = []
+        for hits in batches:
+            scores = dict(hits)
+            results.append([
+                {"id": point["id"], "score": scores[point["row"]], "payload": point["payload"] if with_payload else None}
+                for point in collection.points([row for row, _ in hits])
+            ])
+        return results
+
+    def get_document(self, point_id: str):
+        collection = self._collection(self.doc_collection)
+        if collection is None:
+            return None
+        row = collection.id_to_row.get(str(point_id))
+        if row is None:
+            return None
+        points = collection.points([row])
+        return {"id": points[0]["id"], "payload": points[0]["payload"]} if points else None
+
+    def upsert_chat(self, conversation_id: str, query: str, response: str, vector: List[float]):
+        collection = self._vector_collection(self.chat_collection, [vector])
+        collection.upsert([str(uuid.uuid4())], [vector], [{
+            "conversation_id": conversation_id,
+            "query": query,
+            "response": response,
+            "timestamp": time.time()
+        }])
+
+    def upsert_conversation(self, conversation_id: str, title: str, folder_id: str = None):
+        payload = {"title": title, "updated_at": time.time()}
+        if folder_id:
+            payload["folder_id"] = folder_id
+        self._collection(self.conversation_collection, 1).upsert([conversation_id], [[0.0]], [payload])
+
+    def delete_chat(self, conversation_id: str):
+        chats = self._collection(self.chat_collection)
+        if chats is not None:
+            chats.delete([point["id"] for point in chats.points(chats.find("conversation_id", conversation_id))])
+        conversations = self._collection(self.conversation_collection)
+        if conversations is not None:
+            conversations.delete([conversation_id])
+
+    # --- Folder Management ---
+    def upsert_folder(self, folder_id: str, name: str):
+        self._collection(self.folder_collection, 1).upsert(
+            [folder_id], [[0.0]], [{"name": name, "created_at": time.time()}]
+        )
+
+    def delete_folder(self, folder_id: str):
+        folders = self._collection(self.folder_collection)
+        if folders is not None:
+            folders.delete([folder_id])
+
+    def get_folders(self) -> List[Dict[str, Any]]:
+        folders = self._collection(self.folder_collection)
+        if folders is None:
+            return []
+        results = []
+        for point in folders.points(folders.all_rows()):
+            payload = point["payload"] or {}
+            results.append({
+                "id": point["id"],
+                "name": payload.get("name", "Unnamed"),
+                "created_at": payload.get("created_at", 0)
+            })
+        results.sort(key=lambda x: x["created_at"])
+        return results
+
+    def clear_chat_collection(self):
+        self._drop_collection(self.chat_collection)
+        self._drop_collection(self.conversation_collection)
+
+    def get_conversations(self, limit: int = 50) -> List[Dict[str, Any]]:
+        conversations = self._collection(self.conversation_collection)
+        if conversations is None:
+            return []
+        results = []
+        for point in conversations.points(conversations.all_rows()):
+            payload = point["payload"] or {}
+            results.append({
+                "id": point["id"],
+                "title": payload.get("title", "New Chat"),
+                "updated_at": payload.get("updated_at", 0),
+                "folder_id": payload.get("folder_id")
+            })
+        results.sort(key=lambda x: x["updated_at"], reverse=True)
+        return results[:limit]
+
+    def get_chat_history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        chats = self._collection(self.chat_collection)
+        if chats is None:
+            return []
+        results = []
+        for point in chats.points(chats.find("conversation_id", conversation_id)):
+            payload = point["payload"] or {}
+            if payload.get("query") and payload.get("response"):
+                results.append({
+                    "id": point["id"],
+                    "query": payload.get("query"),
+                    "response": payload.get("response"),
+                    "timestamp": payload.get("timestamp", 0)
+                })
+        results.sort(key=lambda x: x["timestamp"])
+        return results[:100] # Max messages per chat, as in QdrantRepository
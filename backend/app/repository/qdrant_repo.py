@@ -1,27 +1,54 @@
+import math
 import os
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 from typing import List, Dict, Any
+from app.core.embeddings import EmbeddingDimMismatch, configured_embedding_dim
+from app.core.deadline import client_timeout
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+# Optional embedded Qdrant (":memory:" or a directory), e.g. for load tests without a server
+QDRANT_LOCATION = os.getenv("QDRANT_LOCATION")
+# Request timeout in seconds, so chat calls abandoned at their deadline still end:
+# by default the longest chat stage budget served by Qdrant (search, store), but
+# at least MIN_QDRANT_TIMEOUT since ingestion batches share the client
+MIN_QDRANT_TIMEOUT = 5
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", 0)) or max(
+    MIN_QDRANT_TIMEOUT, math.ceil(max(client_timeout("search") or 0, client_timeout("store") or 0)))
+# Storage type for document/chat vectors: float32 (default), float16 or uint8
+VECTOR_DATATYPE = os.getenv("VECTOR_DATATYPE", "float32")
+# Chunk payload fields that describe where the chunk sits in its source
+POSITION_KEYS = ("chunk_index", "start", "end", "page")
 
 class QdrantRepository:
     def __init__(self):
         # connect to Qdrant; when running inside Docker, set QDRANT_HOST to 'qdrant'
-        url = f"http://{QDRANT_HOST}:{QDRANT_PORT}"
-        self.client = QdrantClient(url=url)
+        if QDRANT_LOCATION == ":memory:":
+            self.client = QdrantClient(location=QDRANT_LOCATION)
+        elif QDRANT_LOCATION:
+            self.client = QdrantClient(path=QDRANT_LOCATION)
+        else:
+            url = f"http://{QDRANT_HOST}:{QDRANT_PORT}"
+            self.client = QdrantClient(url=url, timeout=QDRANT_TIMEOUT)
         self.doc_collection = "documents"
         self.doc_collection = "documents"
         self.chat_collection = "chats" # Stores individual messages
         self.conversation_collection = "conversations" # Stores conversation metadata
         self.folder_collection = "folders" # Stores folder metadata
+        self.vector_size = configured_embedding_dim()
+        self.vector_datatype = VECTOR_DATATYPE
+        self._source_indexed = False
+        self._verified_collections = set()
+        if self.vector_datatype not in ("float32", "float16", "uint8"):
+            raise ValueError(f"Unsupported VECTOR_DATATYPE: {self.vector_datatype}")
 
 
         # ensure collections exist with a default vector size (will be recreated later once embedder available)
         # we will lazily create collections with correct vector size via set_collection_vector_size if needed
 
-    def set_collection_vector_size(self, collection_name: str, vector_size: int):
+    def set_collection_vector_size(self, collection_name: str, vector_size: int, datatype: str = None):
+        datatype = datatype or self.vector_datatype
         try:
             # delete and recreate to ensure correct size
             if self.client.get_collection(collection_name=collection_name):
@@ -30,20 +57,103 @@ class QdrantRepository:
             pass
         self.client.recreate_collection(
             collection_name=collection_name,
-            vectors_config=rest.VectorParams(size=vector_size, distance=rest.Distance.COSINE),
+            vectors_config=rest.VectorParams(
+                size=vector_size, distance=rest.Distance.COSINE,
+                datatype=self._storage_datatype(datatype), on_disk=datatype == "uint8" or None,
+            ),
+            quantization_config=self._quantization_config(datatype),
+        )
+        self._verified_collections.discard(collection_name)
+        if collection_name == self.doc_collection:
+            self._source_indexed = False
+            self._ensure_source_index()
+
+    @staticmethod
+    def _storage_datatype(datatype: str):
+        return rest.Datatype.FLOAT16 if datatype == "float16" else None
+
+    @staticmethod
+    def _quantization_config(datatype: str):
+        # Qdrant's uint8 datatype stores raw 0..255 values, which breaks cosine on
+        # normalized embeddings. Use int8 scalar quantization instead: 1 byte per
+        # dimension in RAM, originals kept on disk for rescoring.
+        if datatype != "uint8":
+            return None
+        return rest.ScalarQuantization(scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, always_ram=True))
+
+    def _check_storage(self, collection_name: str, info):
+        """
+        Bring an existing collection's storage in line with VECTOR_DATATYPE.
+        Quantization can be switched in place; the stored element type cannot,
+        so a float16 <-> float32 mismatch is only reported.
+        """
+        stored = info.config.params.vectors.datatype or rest.Datatype.FLOAT32
+        wanted = self._storage_datatype(self.vector_datatype) or rest.Datatype.FLOAT32
+        quantized = isinstance(info.config.quantization_config, rest.ScalarQuantization)
+        if stored != wanted:
+            print(f"WARNING: collection {collection_name} stores {stored.value} vectors but VECTOR_DATATYPE is "
+                  f"{self.vector_datatype}; recreate it (or restore a snapshot) to change storage type")
+        elif quantized != (self.vector_datatype == "uint8"):
+            self.client.update_collection(
+                collection_name=collection_name,
+                vectors_config={"": rest.VectorParamsDiff(on_disk=not quantized)},
+                quantization_config=self._quantization_config(self.vector_datatype) or rest.Disabled.DISABLED,
+            )
+            print(f"DEBUG: {'Disabled' if quantized else 'Enabled'} int8 quantization on {collection_name}")
+
+    def _ensure_source_index(self):
+        # Keyword index on "source" so per-document scrolls/deletes do not scan the
+        # whole collection; creating an existing index is a no-op for Qdrant
+        if self._source_indexed or QDRANT_LOCATION:
+            # Embedded Qdrant ignores payload indexes
+            return
+        self.client.create_payload_index(
+            collection_name=self.doc_collection,
+            field_name="source",
+            field_schema=rest.PayloadSchemaType.KEYWORD,
         )
+        self._source_indexed = True
+
+    def _verify_collection(self, collection_name: str) -> bool:
+        """
+        False if the collection does not exist yet. Otherwise check its vector size
+        against EMBEDDING_DIM (raising EmbeddingDimMismatch) and reconcile its
+        storage; checked once per process, set_collection_vector_size resets this.
+        """
+        if collection_name in self._verified_collections:
+            return True
+        if not self.client.collection_exists(collection_name=collection_name):
+            return False
+        info = self.client.get_collection(collection_name=collection_name)
+        if info.config.params.vectors.size != self.vector_size:
+            raise EmbeddingDimMismatch(collection_name, info.config.params.vectors.size, self.vector_size)
+        self._check_storage(collection_name, info)
+        self._verified_collections.add(collection_name)
+        return True
+
+    def verify_vector_collections(self):
+        """
+        Startup check: raise EmbeddingDimMismatch if an existing collection was
+        built with another EMBEDDING_DIM.
+        """
+        for collection_name in (self.doc_collection, self.chat_collection):
+            self._verify_collection(collection_name)
+
+    def _ensure_vector_collection(self, collection_name: str, vectors: List[List[float]]):
+        # Collections are sized from the configured embedding dimension, not from
+        # whatever vectors happen to arrive
+        if any(len(v) != self.vector_size for v in vectors):
+            raise ValueError(f"Vector size {len(vectors[0])} does not match configured EMBEDDING_DIM {self.vector_size}.")
+        if not self._verify_collection(collection_name):
+            self.set_collection_vector_size(collection_name, self.vector_size)
+            self._verified_collections.add(collection_name)
 
     def upsert_documents(self, ids: List[str], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
         if not vectors:
             return
         # ensure collection vector size matches
-        vector_size = len(vectors[0])
-        try:
-            info = self.client.get_collection(collection_name=self.doc_collection)
-            if info.config.params.vectors.size != vector_size:
-                 self.set_collection_vector_size(self.doc_collection, vector_size)
-        except Exception:
-            self.set_collection_vector_size(self.doc_collection, vector_size)
+        self._ensure_vector_collection(self.doc_collection, vectors)
+        self._ensure_source_index()
         points = [
             rest.PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i])
             for i in range(len(ids))
@@ -53,6 +163,69 @@ class QdrantRepository:
             print(f"DEBUG: Upserted {len(points)} points to {self.doc_collection}")
         except Exception as e:
             print(f"DEBUG: Upsert failed: {e}")
+            raise
+
+    def get_document_ids(self, source: str) -> List[str]:
+        return list(self.get_document_positions(source))
+
+    def get_document_positions(self, source: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Every chunk stored for this source: point id -> its position payload
+        (chunk_index, start, end, page). Texts and vectors are not fetched.
+        """
+        # A missing collection just means nothing has been ingested yet; any other
+        # failure must surface, or callers would treat the source as empty. A
+        # collection of another vector size raises: its chunks are not "unchanged".
+        if not self._verify_collection(self.doc_collection):
+            return {}
+        self._ensure_source_index()
+        source_filter = rest.Filter(
+            must=[rest.FieldCondition(key="source", match=rest.MatchValue(value=source))]
+        )
+        positions = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.doc_collection,
+                scroll_filter=source_filter,
+                limit=256,
+                offset=offset,
+                with_payload=list(POSITION_KEYS),
+                with_vectors=False,
+            )
+            for point in points:
+                positions[str(point.id)] = point.payload or {}
+            if offset is None:
+                break
+        return positions
+
+    def update_document_payloads(self, payloads: Dict[str, Dict[str, Any]]):
+        # Merge new payload fields into existing chunks (vectors untouched)
+        if not payloads:
+            return
+        self.client.batch_update_points(
+            collection_name=self.doc_collection,
+            update_operations=[
+                rest.SetPayloadOperation(set_payload=rest.SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ],
+        )
+        print(f"DEBUG: Updated payloads of {len(payloads)} points in {self.doc_collection}")
+
+    def delete_documents(self, ids: List[str]):
+        if not ids:
+            return
+        self.client.delete(
+            collection_name=self.doc_collection,
+            points_selector=rest.PointIdsList(points=list(ids)),
+        )
+        print(f"DEBUG: Deleted {len(ids)} points from {self.doc_collection}")
+
+    def delete_document_source(self, source: str) -> int:
+        # Remove every chunk of a document; returns the number of deleted chunks
+        ids = self.get_document_ids(source)
+        self.delete_documents(ids)
+        return len(ids)
 
     
     def _search_impl(self, collection_name: str, vector: List[float], limit: int, with_payload: bool):
@@ -91,21 +264,47 @@ class QdrantRepository:
             print(f"DEBUG: Search failed for collection {collection_name}: {e}")
             # If collection doesn't exist or other error, return empty
             return []
-        results = []
-        for hit in hits:
-            payload = hit.payload if hasattr(hit, "payload") else (hit.payload or {})
-            results.append({"id": hit.id, "score": hit.score, "payload": payload})
-        return results
+        return [self._hit_to_dict(hit) for hit in hits]
+
+    def get_document(self, point_id: str):
+        # Fetch a single chunk (payload only) by point id; None if missing
+        try:
+            points = self.client.retrieve(collection_name=self.doc_collection, ids=[point_id], with_payload=True)
+        except Exception as e:
+            print(f"DEBUG: Retrieve failed for point {point_id}: {e}")
+            return None
+        if not points:
+            return None
+        return {"id": points[0].id, "payload": points[0].payload or {}}
+
+    def search_batch(self, collection_name: str, vectors: List[List[float]], limit: int = 5, with_payload: bool = True):
+        # One round trip for many query vectors; returns one result list per vector.
+        # Only a missing collection means "no hits"; other failures raise, so batch
+        # callers never mistake an outage for empty results.
+        if not self.client.collection_exists(collection_name):
+            return [[] for _ in vectors]
+        if hasattr(self.client, "search_batch"):
+            batches = self.client.search_batch(
+                collection_name=collection_name,
+                requests=[rest.SearchRequest(vector=v, limit=limit, with_payload=with_payload) for v in vectors],
+            )
+        else:
+            responses = self.client.query_batch_points(
+                collection_name=collection_name,
+                requests=[rest.QueryRequest(query=v, limit=limit, with_payload=with_payload) for v in vectors],
+            )
+            batches = [response.points for response in responses]
+        print(f"DEBUG: Batch search in {collection_name} ran {len(batches)} queries")
+        return [[self._hit_to_dict(hit) for hit in hits] for hits in batches]
+
+    @staticmethod
+    def _hit_to_dict(hit) -> Dict[str, Any]:
+        payload = hit.payload if hasattr(hit, "payload") else (hit.payload or {})
+        return {"id": hit.id, "score": hit.score, "payload": payload}
 
     def upsert_chat(self, conversation_id: str, query: str, response: str, vector: List[float]):
         # store chat as a point in chat_collection
-        try:
-            info = self.client.get_collection(collection_name=self.chat_collection)
-            # Check if dimension matches
-            if info.config.params.vectors.size != len(vector):
-                self.set_collection_vector_size(self.chat_collection, len(vector))
-        except Exception:
-            self.set_collection_vector_size(self.chat_collection, len(vector))
+        self._ensure_vector_collection(self.chat_collection, [vector])
         import uuid
         import time
         # We store the conversation_id in the payload so we can filter by it
@@ -226,16 +425,14 @@ class QdrantRepository:
             return []
 
     def clear_chat_collection(self):
+        self._verified_collections.discard(self.chat_collection)
         try:
             self.client.delete_collection(collection_name=self.chat_collection)
         except Exception:
             pass
-        # recreate empty chat collection with fallback size 1 (will be set correctly on next upsert)
+        # recreate empty chat collection with the configured size and datatype
         try:
-            self.client.recreate_collection(
-                collection_name=self.chat_collection,
-                vectors_config=rest.VectorParams(size=768, distance=rest.Distance.COSINE),
-            )
+            self.set_collection_vector_size(self.chat_collection, self.vector_size)
         except Exception:
             pass
         
@@ -1,14 +1,22 @@
+import json
+import os
 from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
+from app.core.admission import LANES, upstream_status
 from app.services.chat_service import answer_query, reset_chat_history
 
 router = APIRouter()
 
+BATCH_MAX_QUERIES = int(os.getenv("CHAT_BATCH_MAX_QUERIES", 256))
+
 class ChatRequest(BaseModel):
     query: str
     conversation_id: Optional[str] = None
     top_k: Optional[int] = 5
+    # "lean" returns context references (id, source, score, snippet) instead of full texts
+    response_mode: Optional[Literal["full", "lean"]] = "full"
 
 @router.post("/")
 async def chat_query(req: ChatRequest):
@@ -18,10 +26,66 @@ async def chat_query(req: ChatRequest):
     if not req.query or not req.query.strip():
         raise HTTPException(status_code=400, detail="Query must be non-empty.")
     try:
-        response = await answer_query(req.query, conversation_id=req.conversation_id, top_k=req.top_k)
+        response = await answer_query(req.query, conversation_id=req.conversation_id, top_k=req.top_k, response_mode=req.response_mode)
         return response
+    except Exception as e:
+        # Gemini quota or Qdrant outages: tell the client to back off, as admission does
+        status = upstream_status(e)
+        if status is not None:
+            raise HTTPException(status_code=status, detail=str(e), headers={"Retry-After": str(LANES["chat"].retry_after)})
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchChatRequest(BaseModel):
+    queries: List[str]
+    top_k: Optional[int] = 5
+    concurrency: Optional[int] = None
+    response_mode: Optional[Literal["full", "lean"]] = "full"
+
+@router.post("/batch")
+async def chat_batch(req: BatchChatRequest):
+    """
+    Answer many queries in one request (offline evaluation, FAQ pre-answering).
+    Results stream back as NDJSON, one line per query, in completion order.
+    """
+    if not req.queries or any(not q or not q.strip() for q in req.queries):
+        raise HTTPException(status_code=400, detail="Queries must be a non-empty list of non-empty strings.")
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+    try:
+        from app.services.chat_service import answer_queries_batch, BATCH_CONCURRENCY
+        concurrency = min(req.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+        results = await answer_queries_batch(req.queries, top_k=req.top_k, concurrency=concurrency, response_mode=req.response_mode)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def ndjson():
+        async for result in results:
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/contexts/{point_id}")
+async def get_context_text(point_id: str):
+    """
+    Full text and metadata of a retrieved context, for lean chat responses.
+    """
+    try:
+        from app.services.chat_service import get_context
+        context = await get_context(point_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if context is None:
+        raise HTTPException(status_code=404, detail="Context not found.")
+    return context
+
+@router.get("/stats")
+async def chat_stats():
+    """
+    Chat pipeline counters: coalesced duplicate requests, per-stage timeouts and
+    hedges, and degraded (cached/extractive/timed-out) answers.
+    """
+    from app.services.chat_service import coalescing_stats
+    return coalescing_stats()
 
 @router.post("/reset")
 async def reset():
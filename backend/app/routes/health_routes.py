@@ -1,7 +1,12 @@
 from fastapi import APIRouter
+from app.core.admission import admission_stats
 
 router = APIRouter()
 
 @router.get("/ping")
 def ping():
-    return {"status":"ok","service":"backend","message":"pong"}
\ No newline at end of file
+    return {"status":"ok","service":"backend","message":"pong"}
+
+@router.get("/admission")
+def admission():
+    return {"lanes": admission_stats()}
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.services.ingestion_service import ingest_document, ingest_audio_file
+from app.services.ingestion_service import ingest_document, ingest_audio_file, delete_document
 
 router = APIRouter()
 
@@ -7,11 +7,12 @@ router = APIRouter()
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload a document (PDF or text). The ingestion service will extract text,
-    chunk, embed and store into Qdrant.
+    chunk, embed and store into Qdrant. Re-uploading a file with the same name
+    replaces its previous version, embedding only the chunks that changed.
     """
     try:
-        inserted = await ingest_document(file)
-        return {"status": "ok", "inserted": inserted}
+        result = await ingest_document(file)
+        return {"status": "ok", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -22,7 +23,20 @@ async def upload_voice(file: UploadFile = File(...)):
     then ingest the transcribed text like a document.
     """
     try:
-        inserted = await ingest_audio_file(file)
-        return {"status": "ok", "inserted": inserted}
+        result = await ingest_audio_file(file)
+        return {"status": "ok", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/document/{source:path}")
+async def remove_document(source: str):
+    """
+    Delete every stored chunk of a previously uploaded document.
+    """
+    try:
+        deleted = await delete_document(source)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"No chunks stored for source '{source}'.")
+    return {"status": "ok", "deleted": deleted, "source": source}
@@ -1,17 +1,45 @@
-from typing import List, Dict, Any
-from app.repository.qdrant_repo import QdrantRepository
+from typing import List, Dict, Any, Tuple, AsyncIterator
+from app.repository.factory import get_repository
 from app.core.embeddings import Embedder
+from app.core.deadline import CHAT_DEADLINE_MS, Deadline, StageTimeout, call_stage, client_timeout, stage_budget, stage_stats
+from starlette.concurrency import run_in_threadpool
+from collections import OrderedDict
+import asyncio
 import os
 
-QDRANT = QdrantRepository()
-EMBEDDER = Embedder(model_name=os.getenv("EMBEDDING_MODEL", "gemini-embedding-001"))
+QDRANT = get_repository()
+EMBEDDER = Embedder(model_name=os.getenv("EMBEDDING_MODEL", "gemini-embedding-001"), timeout=client_timeout("embed"))
 
-async def answer_query(query: str, conversation_id: str = None, top_k: int = 5) -> Dict[str, Any]:
+# Single-flight: identical in-flight questions share one embed/search/generate run
+_INFLIGHT: Dict[Tuple[str, int], "asyncio.Future"] = {}
+COALESCED_REQUESTS = 0
+
+BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 4))
+CONTEXT_SNIPPET_CHARS = int(os.getenv("CONTEXT_SNIPPET_CHARS", 160))
+
+# Deadline and stage budgets (CHAT_DEADLINE_MS, CHAT_*_BUDGET_MS) live in app.core.deadline
+
+# Last good answers per coalesce key, served when a stage runs out of time or the LLM fails
+ANSWER_CACHE_SIZE = int(os.getenv("CHAT_ANSWER_CACHE_SIZE", 1024))
+_ANSWER_CACHE: "OrderedDict[Tuple[str, int], Tuple[List[float], List[Dict[str, Any]], str]]" = OrderedDict()
+DEGRADED_ANSWERS = {"cached": 0, "extractive": 0, "timeout": 0}
+EXTRACTIVE_PASSAGES = 3
+
+class GenerationError(Exception):
+    """
+    The LLM produced no answer (missing API key, API error or client timeout).
+    """
+
+async def answer_query(query: str, conversation_id: str = None, top_k: int = 5, response_mode: str = "full") -> Dict[str, Any]:
     """
     Embed the query, search Qdrant for top_k contexts, and build an answer.
     The current LLM call is a placeholder: the function synthesizes a simple answer
     by concatenating retrieved contexts. Replace call to 'synthesize_answer' with a
     proper LLM chain (LangChain + model) when ready.
+    response_mode "full" returns context texts, "lean" returns context references
+    (see format_contexts). Runs under CHAT_DEADLINE_MS, storing the exchange
+    included; a "degraded" key marks answers served from cache, from retrieved
+    passages only, or given up on.
     """
     import uuid
     
@@ -22,60 +50,194 @@ async def answer_query(query: str, conversation_id: str = None, top_k: int = 5)
     else:
         is_new_conversation = False
 
+    deadline = Deadline(CHAT_DEADLINE_MS / 1000)
     try:
-        query_vector = EMBEDDER.embed_query(query)
-        print(f"DEBUG: Query vector len={len(query_vector)}")
+        # Embedding, search, generation and storing are blocking network calls; each
+        # runs as a deadline stage on the stage workers (see app.core.deadline).
+        query_vector, hits, answer, degraded = await _coalesced_retrieve_and_answer(query, top_k, deadline)
+        contexts = format_contexts(hits, response_mode)
+        try:
+            # Not hedged: a chat record gets a fresh id on every call
+            await call_stage("store", _store_exchange, conversation_id, is_new_conversation, query, answer, query_vector,
+                             timeout=deadline.budget(stage_budget("store")))
+        except StageTimeout as e:
+            # The answer is still good; the exchange may be missing from the history
+            print(f"WARNING: chat exchange not stored: {e}")
         
-        results = QDRANT.search(collection_name="documents", vector=query_vector, limit=top_k, with_payload=True)
-        print(f"DEBUG: Search returned {len(results)} hits")
-        
-        contexts = [hit["payload"]["text"] for hit in results]
-        
-        # For now, synthesize a naive answer by returning the most relevant context plus an echo
-        answer = synthesize_answer(query, contexts)
-        
-        # Upsert conversation metadata (title based on first query if new, or just update timestamp)
-        # In a real app we might want to generate a summary title. For now use truncated query.
-        if is_new_conversation:
-            title = (query[:30] + '...') if len(query) > 30 else query
-            QDRANT.upsert_conversation(conversation_id=conversation_id, title=title)
-        
-        # store chat
-        QDRANT.upsert_chat(conversation_id=conversation_id, query=query, response=answer, vector=query_vector)
-        
-        return {
+        response = {
             "conversation_id": conversation_id,
             "answer": answer, 
             "retrieved_count": len(contexts), 
             "contexts": contexts
         }
+        if degraded:
+            # "cached" or "extractive": the answer did not come from a fresh LLM call
+            response["degraded"] = degraded
+        return response
+    except StageTimeout as e:
+        print(f"DEBUG: answer_query gave up: {e}")
+        DEGRADED_ANSWERS["timeout"] += 1
+        return {
+            "conversation_id": conversation_id,
+            "answer": "Sorry, this is taking longer than expected. Please try again in a moment.",
+            "retrieved_count": 0,
+            "contexts": [],
+            "degraded": "timeout"
+        }
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        # Embed/search/store failures (e.g. quota errors) propagate so the route can
+        # answer 429/503 instead of a 200 with an error string
         print(f"ERROR in answer_query: {e}")
-        # Return a polite error message instead of crashing
-        return {"answer": f"I apologize, but I encountered an internal error: {str(e)}", "retrieved_count": 0, "contexts": []}
+        raise
+
+def _coalesce_key(query: str, top_k: int) -> Tuple[str, int]:
+    # Case and whitespace differences do not change the retrieval or the answer
+    return " ".join(query.split()).casefold(), top_k
+
+async def _coalesced_retrieve_and_answer(query: str, top_k: int, deadline: Deadline):
+    """
+    Run _answer_within_deadline once per distinct (normalized query, top_k) among
+    concurrent callers, under the first caller's deadline; later callers await its
+    result. Each caller still stores its own chat record.
+    """
+    global COALESCED_REQUESTS
+    key = _coalesce_key(query, top_k)
+    task = _INFLIGHT.get(key)
+    if task is not None:
+        COALESCED_REQUESTS += 1
+    else:
+        task = asyncio.ensure_future(_answer_within_deadline(query, top_k, deadline))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    # Shield so one caller disconnecting does not cancel the shared computation
+    return await asyncio.shield(task)
+
+def coalescing_stats() -> Dict[str, Any]:
+    return {
+        "coalesced_requests": COALESCED_REQUESTS,
+        "in_flight": len(_INFLIGHT),
+        "stages": stage_stats(),
+        "degraded_answers": dict(DEGRADED_ANSWERS),
+    }
+
+async def _answer_within_deadline(query: str, top_k: int, deadline: Deadline):
+    """
+    Embed, search and generate under `deadline`, each stage with its own budget;
+    generation gets what is left after the store budget. Embed and search are
+    idempotent and may be hedged. Returns (query_vector, hits, answer, degraded)
+    where degraded is None, "cached" (last good answer for this question) or
+    "extractive" (top passages, no LLM); both also cover LLM failures. Raises
+    StageTimeout when retrieval timed out or was rejected and nothing is cached.
+    """
+    key = _coalesce_key(query, top_k)
+    try:
+        query_vector = await call_stage("embed", _embed_query, query,
+                                        timeout=deadline.budget(stage_budget("embed")), hedge=True)
+        hits = await call_stage("search", _search_documents, query_vector, top_k,
+                                timeout=deadline.budget(stage_budget("search")), hedge=True)
+    except StageTimeout as e:
+        cached = _ANSWER_CACHE.get(key)
+        if cached is None:
+            raise
+        print(f"DEBUG: {e}; serving cached answer")
+        DEGRADED_ANSWERS["cached"] += 1
+        return (*cached, "cached")
+
+    contexts = [hit["payload"]["text"] for hit in hits]
+    timeout = deadline.budget(reserve=stage_budget("store"))
+    try:
+        # Not hedged: generation is neither cheap nor deterministic. The LLM client
+        # gets the same timeout, so an abandoned call does not outlive the deadline.
+        answer = await call_stage("generate", synthesize_answer, query, contexts, timeout, timeout=timeout)
+    except (StageTimeout, GenerationError) as e:
+        cached = _ANSWER_CACHE.get(key)
+        if cached is not None:
+            print(f"DEBUG: {e}; serving cached answer")
+            DEGRADED_ANSWERS["cached"] += 1
+            return query_vector, hits, cached[2], "cached"
+        print(f"DEBUG: {e}; answering from retrieved contexts")
+        DEGRADED_ANSWERS["extractive"] += 1
+        return query_vector, hits, extractive_answer(contexts), "extractive"
+
+    _ANSWER_CACHE[key] = (query_vector, hits, answer)
+    _ANSWER_CACHE.move_to_end(key)
+    if len(_ANSWER_CACHE) > ANSWER_CACHE_SIZE:
+        _ANSWER_CACHE.popitem(last=False)
+    return query_vector, hits, answer, None
+
+def _embed_query(query: str) -> List[float]:
+    query_vector = EMBEDDER.embed_query(query)
+    print(f"DEBUG: Query vector len={len(query_vector)}")
+    return query_vector
+
+def _search_documents(query_vector: List[float], top_k: int) -> List[Dict[str, Any]]:
+    results = QDRANT.search(collection_name="documents", vector=query_vector, limit=top_k, with_payload=True)
+    print(f"DEBUG: Search returned {len(results)} hits")
+    return results
+
+def extractive_answer(contexts: List[str]) -> str:
+    """
+    Fallback answer without the LLM: the most relevant retrieved passages.
+    """
+    if not contexts:
+        return "I could not find relevant information in the ingested documents."
+    passages = "\n\n".join(f"- {text.strip()}" for text in contexts[:EXTRACTIVE_PASSAGES])
+    return f"I could not generate a full answer right now. These are the most relevant passages I found:\n\n{passages}"
+
+def format_contexts(hits: List[Dict[str, Any]], response_mode: str = "full") -> List[Any]:
+    """
+    "full": the context texts. "lean": references (point id, source, score and a
+    short snippet); the full text is fetchable via get_context(id).
+    """
+    if response_mode == "lean":
+        return [
+            {
+                "id": hit["id"],
+                "source": hit["payload"].get("source"),
+                "score": round(hit["score"], 4),
+                "snippet": hit["payload"]["text"][:CONTEXT_SNIPPET_CHARS]
+            }
+            for hit in hits
+        ]
+    return [hit["payload"]["text"] for hit in hits]
+
+async def get_context(point_id: str):
+    return await run_in_threadpool(QDRANT.get_document, point_id)
+
+def _store_exchange(conversation_id: str, is_new_conversation: bool, query: str, answer: str, query_vector: List[float]):
+    # Upsert conversation metadata (title based on first query if new, or just update timestamp)
+    # In a real app we might want to generate a summary title. For now use truncated query.
+    if is_new_conversation:
+        title = (query[:30] + '...') if len(query) > 30 else query
+        QDRANT.upsert_conversation(conversation_id=conversation_id, title=title)
+    
+    # store chat
+    QDRANT.upsert_chat(conversation_id=conversation_id, query=query, response=answer, vector=query_vector)
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-def synthesize_answer(query: str, contexts: List[str]) -> str:
+def synthesize_answer(query: str, contexts: List[str], timeout: float = None) -> str:
     """
     Synthesize an answer using Google Gemini API via LangChain.
+    `timeout` (seconds, default: the generate stage's client timeout) bounds the
+    API request. Raises GenerationError when no answer could be generated.
     """
     if not contexts:
         return "I could not find relevant information in the ingested documents."
     
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
-        return "Error: GEMINI_API_KEY not set."
+        raise GenerationError("GEMINI_API_KEY not set.")
 
     try:
         # Initialize LangChain Chat Model
         # Using gemini-2.5-flash as requested by user.
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=api_key, temperature=0.7)
+        # One attempt: retries would run past the deadline the timeout comes from.
+        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=api_key, temperature=0.7,
+                                     timeout=client_timeout("generate") if timeout is None else timeout, max_retries=1)
         
         context_blob = "\n\n".join(contexts[:5]) 
         
@@ -95,32 +257,78 @@ Question: {question}
         return response
     except Exception as e:
         print(f"LangChain Error: {e}")
-        return f"I encountered an error connecting to the intelligence engine: {e}"
+        raise GenerationError(f"Could not reach the intelligence engine: {e}") from e
+
+async def answer_queries_batch(queries: List[str], top_k: int = 5, concurrency: int = BATCH_CONCURRENCY, response_mode: str = "full") -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer many queries at once: one batched embedding call, one Qdrant batch
+    search, then LLM syntheses with at most `concurrency` running at a time.
+    A failed synthesis falls back to the extractive answer ("degraded": "extractive").
+    Embedding/search errors raise here; the returned async iterator yields one
+    result per query in completion order (use "index" to match them up).
+    Batch answers are not stored as chats.
+    """
+    query_vectors = await run_in_threadpool(EMBEDDER.embed_queries, queries)
+    hit_lists = await run_in_threadpool(QDRANT.search_batch, "documents", query_vectors, top_k, True)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer_one(index: int) -> Dict[str, Any]:
+        contexts = [hit["payload"]["text"] for hit in hit_lists[index]]
+        degraded = None
+        async with semaphore:
+            try:
+                answer = await run_in_threadpool(synthesize_answer, queries[index], contexts)
+            except GenerationError as e:
+                print(f"DEBUG: {e}; answering from retrieved contexts")
+                DEGRADED_ANSWERS["extractive"] += 1
+                answer, degraded = extractive_answer(contexts), "extractive"
+        result = {
+            "index": index,
+            "query": queries[index],
+            "answer": answer,
+            "retrieved_count": len(contexts),
+            "contexts": format_contexts(hit_lists[index], response_mode)
+        }
+        if degraded:
+            result["degraded"] = degraded
+        return result
+
+    async def results() -> AsyncIterator[Dict[str, Any]]:
+        tasks = [asyncio.ensure_future(answer_one(i)) for i in range(len(queries))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away mid-stream: drop syntheses that have not started
+            for task in tasks:
+                task.cancel()
+
+    return results()
 
 async def reset_chat_history():
-    QDRANT.clear_chat_collection()
+    await run_in_threadpool(QDRANT.clear_chat_collection)
 
 async def get_conversations():
-    return QDRANT.get_conversations()
+    return await run_in_threadpool(QDRANT.get_conversations)
 
 async def get_chat_history(conversation_id: str):
-    return QDRANT.get_chat_history(conversation_id)
+    return await run_in_threadpool(QDRANT.get_chat_history, conversation_id)
 
 async def delete_chat(conversation_id: str):
-    QDRANT.delete_chat(conversation_id)
+    await run_in_threadpool(QDRANT.delete_chat, conversation_id)
 
 # --- Folders ---
 async def create_folder(name: str):
     import uuid
     folder_id = str(uuid.uuid4())
-    QDRANT.upsert_folder(folder_id, name)
+    await run_in_threadpool(QDRANT.upsert_folder, folder_id, name)
     return {"id": folder_id, "name": name}
 
 async def get_folders():
-    return QDRANT.get_folders()
+    return await run_in_threadpool(QDRANT.get_folders)
 
 async def delete_folder(folder_id: str):
-    QDRANT.delete_folder(folder_id)
+    await run_in_threadpool(QDRANT.delete_folder, folder_id)
 
 async def move_chat_to_folder(conversation_id: str, folder_id: str):
     # To "move", we update the conversation metadata.
@@ -132,4 +340,4 @@ async def move_chat_to_folder(conversation_id: str, folder_id: str):
     conversations = await get_conversations()
     target = next((c for c in conversations if c["id"] == conversation_id), None)
     if target:
-        QDRANT.upsert_conversation(conversation_id, title=target.get("title", "Chat"), folder_id=folder_id)
\ No newline at end of file
+        await run_in_threadpool(QDRANT.upsert_conversation, conversation_id, title=target.get("title", "Chat"), folder_id=folder_id)
\ No newline at end of file
@@ -2,12 +2,15 @@ import io
 import os
 import uuid
 import json
+import hashlib
 import subprocess
+from collections import Counter
 from fastapi import UploadFile
-from typing import List
-from app.core.text_splitter import split_text_into_chunks
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Iterable, Iterator, List, Tuple
+from app.core.text_splitter import Chunk, iter_page_chunks, iter_text_chunks
 from app.core.embeddings import Embedder
-from app.repository.qdrant_repo import QdrantRepository
+from app.repository.factory import get_repository
 
 
 
@@ -16,16 +19,96 @@ import speech_recognition as sr
 
 # Instantiate embedder and repo (singleton-style)
 EMBEDDER = Embedder(model_name=os.getenv("EMBEDDING_MODEL", "gemini-embedding-001"))
-QDRANT = QdrantRepository()
+QDRANT = get_repository()
 
-async def ingest_document(file: UploadFile) -> int:
+# Chunks embedded per API call while streaming a document through ingestion
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", 64))
+
+# Fixed namespace so chunk ids are stable across processes and restarts
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2a4e-8d3b-5e7f-9a10-2b3c4d5e6f70")
+
+def chunk_point_id(source: str, text: str, occurrence: int = 0) -> str:
+    """
+    Deterministic point id for a chunk: the same source and content always map to
+    the same id, wherever the chunk moves in the file, so only new text is
+    re-embedded. `occurrence` tells identical chunks of one source apart.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{source}\x00{content_hash}\x00{occurrence}"))
+
+def iter_chunk_ids(source: str, chunks: Iterable[Chunk]) -> Iterator[Tuple[str, Chunk]]:
+    # Occurrences are counted per content digest, so memory stays small for big files
+    seen = Counter()
+    for chunk in chunks:
+        digest = hashlib.sha256(chunk.text.encode("utf-8")).digest()
+        yield chunk_point_id(source, chunk.text, seen[digest]), chunk
+        seen[digest] += 1
+
+def sync_document_chunks(source: str, chunks: Iterable[Chunk]) -> Dict[str, int]:
+    """
+    Diff the new chunk stream of a source against the points already stored for it.
+    Chunks are consumed lazily; new or changed ones are embedded and upserted in
+    batches of EMBED_BATCH_SIZE, unchanged chunks that moved get their position
+    fields updated, and chunks that no longer exist in the source are deleted once
+    the whole stream has been stored.
+    """
+    existing = QDRANT.get_document_positions(source)
+    kept = set()
+    moved = {}
+    batch: List[Tuple[str, Chunk]] = []
+    inserted = 0
+
+    def flush():
+        embeddings = EMBEDDER.embed_documents([chunk.text for _, chunk in batch])
+        QDRANT.upsert_documents(
+            ids=[point_id for point_id, _ in batch],
+            vectors=embeddings,
+            payloads=[_chunk_payload(source, chunk) for _, chunk in batch],
+        )
+        batch.clear()
+
+    for point_id, chunk in iter_chunk_ids(source, chunks):
+        kept.add(point_id)
+        if point_id in existing:
+            if existing[point_id] != _chunk_position(chunk):
+                moved[point_id] = _chunk_position(chunk)
+            continue
+        batch.append((point_id, chunk))
+        inserted += 1
+        if len(batch) >= EMBED_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    if not kept:
+        raise RuntimeError("No text extracted from the document.")
+    QDRANT.update_document_payloads(moved)
+
+    # Delete stale chunks only once the replacement chunks are stored
+    stale = list(set(existing) - kept)
+    QDRANT.delete_documents(stale)
+
+    # "chunks" is what the source is now stored as; "inserted" only counts newly embedded ones
+    return {"chunks": len(kept), "inserted": inserted, "unchanged": len(kept) - inserted,
+            "moved": len(moved), "deleted": len(stale)}
+
+def _chunk_position(chunk: Chunk) -> Dict:
+    position = {"chunk_index": chunk.index, "start": chunk.start, "end": chunk.end}
+    if chunk.page is not None:
+        position["page"] = chunk.page
+    return position
+
+def _chunk_payload(source: str, chunk: Chunk) -> Dict:
+    return {"text": chunk.text, "source": source, **_chunk_position(chunk)}
+
+async def ingest_document(file: UploadFile) -> Dict[str, int]:
     """
     Extract text from uploaded file (PDF or plain text), chunk it, embed chunks,
-    and store in Qdrant. Returns number of inserted chunks.
+    and store in Qdrant. Re-uploading a file with the same name only embeds the
+    chunks that changed. Returns chunks (total stored) and inserted/unchanged/moved/
+    deleted chunk counts.
     """
     import shutil
-    from langchain_community.document_loaders import PyPDFLoader, TextLoader
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
     # Save uploaded file temporarily
     input_path = f"/tmp/{uuid.uuid4()}_{file.filename}"
@@ -34,43 +117,10 @@ async def ingest_document(file: UploadFile) -> int:
         with open(input_path, "wb") as f:
             shutil.copyfileobj(file.file, f)
         
-        documents = []
-        if file.filename.lower().endswith(".pdf"):
-            loader = PyPDFLoader(input_path)
-            documents = loader.load()
-        else:
-            # Fallback for text files
-            loader = TextLoader(input_path)
-            documents = loader.load()
-
-        if not documents:
-             raise RuntimeError("No content extracted from document.")
-
-        # Combine content for simplified chunking or chunk normally
-        # PyPDFLoader returns one document per page usually.
-        # We can split these documents further or just use them.
-        # Requirements said: "read, chunk, and embed".
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        
-        chunks_docs = text_splitter.split_documents(documents)
-        chunks = [doc.page_content for doc in chunks_docs]
-        
-        if not chunks:
-             raise RuntimeError("No text extracted from the uploaded document.")
-
-        embeddings = EMBEDDER.embed_documents(chunks)
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        
-        # Upsert to qdrant
-        # Note: payloads can now include metadata like page number if we wanted, 
-        # but sticking to simple text payload for now to match current schema.
-        QDRANT.upsert_documents(ids=ids, vectors=embeddings, payloads=[{"text": c, "source": file.filename} for c in chunks])
-        return len(chunks)
+        # Parsing, embedding and upserting block; keep them off the event loop.
+        # Pages stream through the splitter into batched embedding calls, so only
+        # one batch of chunks is held in memory at a time.
+        return await run_in_threadpool(sync_document_chunks, file.filename, _iter_chunks(input_path, file.filename))
 
     except Exception as e:
         import traceback
@@ -81,6 +131,45 @@ async def ingest_document(file: UploadFile) -> int:
             os.remove(input_path)
 
 
+def _iter_chunks(input_path: str, filename: str) -> Iterator[Chunk]:
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
+    if filename.lower().endswith(".pdf"):
+        loader = PyPDFLoader(input_path)
+    else:
+        # Fallback for text files
+        loader = TextLoader(input_path)
+
+    # PyPDFLoader yields one document per page; pages are streamed straight
+    # into the splitter so chunk payloads carry page number and offsets.
+    pages = ((doc.page_content, doc.metadata.get("page")) for doc in loader.lazy_load())
+    return iter_page_chunks(pages)
+
+
+def _convert_and_recognize(input_path: str, wav_path: str) -> str:
+    # Convert to WAV using ffmpeg (SpeechRecognition prefers WAV)
+    command = [
+        "ffmpeg", "-i", input_path,
+        "-f", "wav", wav_path,
+        "-y" # overwrite
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Process with SpeechRecognition
+    recognizer = sr.Recognizer()
+
+    with sr.AudioFile(wav_path) as source:
+        audio_data = recognizer.record(source)
+        # Use Google Web Speech API
+        try:
+            transcription = recognizer.recognize_google(audio_data)
+            return transcription
+        except sr.UnknownValueError:
+            return "" # Return empty string if nothing understood
+        except sr.RequestError as e:
+            raise RuntimeError(f"Could not request results from Google Speech Recognition service; {e}")
+
+
 async def transcribe_audio(file: UploadFile) -> str:
     """
     Transcribe audio file using Google Web Speech API (Online).
@@ -95,27 +184,8 @@ async def transcribe_audio(file: UploadFile) -> str:
         with open(input_path, "wb") as f:
             f.write(await file.read())
         
-        # Convert to WAV using ffmpeg (SpeechRecognition prefers WAV)
-        command = [
-            "ffmpeg", "-i", input_path,
-            "-f", "wav", wav_path,
-            "-y" # overwrite
-        ]
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Process with SpeechRecognition
-        recognizer = sr.Recognizer()
-        
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            # Use Google Web Speech API
-            try:
-                transcription = recognizer.recognize_google(audio_data)
-                return transcription
-            except sr.UnknownValueError:
-                return "" # Return empty string if nothing understood
-            except sr.RequestError as e:
-                raise RuntimeError(f"Could not request results from Google Speech Recognition service; {e}")
+        # ffmpeg and the speech API block; run them in the threadpool
+        return await run_in_threadpool(_convert_and_recognize, input_path, wav_path)
 
     except subprocess.CalledProcessError:
         raise RuntimeError("FFmpeg conversion failed. Ensure ffmpeg is installed.")
@@ -130,7 +200,7 @@ async def transcribe_audio(file: UploadFile) -> str:
         if os.path.exists(wav_path):
             os.remove(wav_path)
 
-async def ingest_audio_file(file: UploadFile) -> int:
+async def ingest_audio_file(file: UploadFile) -> Dict[str, int]:
     """
     Save uploaded audio to a temporary path and transcribe.
     Then chunk and ingest the text.
@@ -140,8 +210,10 @@ async def ingest_audio_file(file: UploadFile) -> int:
     if not text.strip():
         raise RuntimeError("Transcription produced empty text.")
 
-    chunks = split_text_into_chunks(text)
-    embeddings = EMBEDDER.embed_documents(chunks)
-    ids = [str(uuid.uuid4()) for _ in chunks]
-    QDRANT.upsert_documents(ids=ids, vectors=embeddings, payloads=[{"text": c, "source": file.filename} for c in chunks])
-    return len(chunks)
\ No newline at end of file
+    return await run_in_threadpool(sync_document_chunks, file.filename, iter_text_chunks(text))
+
+async def delete_document(source: str) -> int:
+    """
+    Remove every stored chunk of a source. Returns number of deleted chunks.
+    """
+    return await run_in_threadpool(QDRANT.delete_document_source, source)
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+Measure /api/chat/ response size and serialization cost for the "full" and
+"lean" response modes: raw JSON bytes, gzip/brotli bytes, and per-response
+encode time with the stdlib json module vs orjson.
+
+Usage (from the backend directory):
+    python bench_chat_response.py --top-k 5 --context-chars 1000 --repeat 2000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.append(os.getcwd())
+
+WORDS = (
+    "policy refund customer account password upload document support invoice "
+    "the a of to and in for is on with that by this be are from or as at"
+).split()
+
+
+def make_hits(top_k: int, context_chars: int, rng: random.Random):
+    hits = []
+    for i in range(top_k):
+        text = ""
+        while len(text) < context_chars:
+            text += " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + ". "
+        hits.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "score": rng.uniform(0.5, 0.9),
+            "payload": {"text": text[:context_chars], "source": f"handbook_{i}.pdf", "page": rng.randint(0, 200)},
+        })
+    return hits
+
+
+def make_response(hits, response_mode: str):
+    # Same shape and context formatting as answer_query. Importing the service
+    # builds its clients, which needs an API key but makes no network calls.
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    from app.services.chat_service import format_contexts
+    return {
+        "conversation_id": str(uuid.uuid4()),
+        "answer": "Refunds are issued within 14 days of the request once the item is received. " * 4,
+        "retrieved_count": len(hits),
+        "contexts": format_contexts(hits, response_mode),
+    }
+
+
+def per_call_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--context-chars", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+        print("orjson not installed; skipping orjson timings")
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("brotli not installed; skipping brotli sizes")
+
+    hits = make_hits(args.top_k, args.context_chars, random.Random(0))
+    print(f"{'mode':<6} {'raw B':>8} {'gzip B':>8} {'br B':>8} {'json us':>9} {'orjson us':>10}")
+    sizes = {}
+    for mode in ("full", "lean"):
+        response = make_response(hits, mode)
+        raw = json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        gzipped = len(gzip.compress(raw, compresslevel=9))
+        brotlied = len(brotli.compress(raw, quality=4)) if brotli else None
+        json_us = per_call_us(lambda: json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), args.repeat)
+        orjson_us = per_call_us(lambda: orjson.dumps(response), args.repeat) if orjson else None
+        sizes[mode] = len(raw)
+        print(f"{mode:<6} {len(raw):>8} {gzipped:>8} {brotlied if brotlied is not None else '-':>8} "
+              f"{json_us:>9.1f} {orjson_us if orjson_us is not None else float('nan'):>10.1f}")
+    saved = sizes["full"] - sizes["lean"]
+    print(f"lean mode saves {saved} bytes per response ({100 * saved / sizes['full']:.1f}% of raw JSON)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare embedding storage settings (EMBEDDING_DIM x VECTOR_DATATYPE): vector
+RAM per million points and top-k overlap against the full-dimension float32
+baseline, searched through the local index (app/repository/local_repo.py).
+
+By default the corpus is synthetic: clustered vectors with a decaying
+per-dimension spectrum, which mimics how Matryoshka-trained models pack most of
+the signal into the leading dimensions. Pass --from-qdrant <collection> to use
+real vectors scrolled from the Qdrant server instead (queries are then sampled
+from the corpus itself).
+
+Usage (from the backend directory):
+    python bench_embedding_precision.py --dims 3072 1536 768 256 --points 20000
+    python bench_embedding_precision.py --from-qdrant documents --dims 3072 768 256
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from app.repository.local_repo import LocalCollection
+
+DATATYPES = ("float32", "float16", "uint8")
+BYTES_PER_VALUE = {"float32": 4, "float16": 2, "uint8": 1}
+
+
+def synthetic(points: int, queries: int, dim: int, clusters: int = 256, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    spectrum = 1.0 / np.sqrt(1.0 + np.arange(dim, dtype=np.float32) / 32.0)
+    centroids = rng.standard_normal((clusters, dim), dtype=np.float32)
+
+    def sample(count):
+        picks = rng.integers(0, clusters, count)
+        return (centroids[picks] + 0.35 * rng.standard_normal((count, dim), dtype=np.float32)) * spectrum
+
+    return sample(points), sample(queries)
+
+
+def from_qdrant(collection_name: str, points: int, queries: int, seed: int = 0):
+    from qdrant_client import QdrantClient
+
+    host = os.getenv("QDRANT_HOST", "localhost")
+    port = int(os.getenv("QDRANT_PORT", 6333))
+    client = QdrantClient(url=f"http://{host}:{port}", timeout=120)
+    vectors, offset = [], None
+    while len(vectors) < points:
+        batch, offset = client.scroll(
+            collection_name=collection_name, limit=min(1000, points - len(vectors)),
+            offset=offset, with_payload=False, with_vectors=True,
+        )
+        vectors.extend(p.vector for p in batch)
+        if offset is None:
+            break
+    corpus = np.asarray(vectors, dtype=np.float32)
+    picks = np.random.default_rng(seed).choice(len(corpus), size=min(queries, len(corpus)), replace=False)
+    return corpus, corpus[picks]
+
+
+def truncate(matrix: np.ndarray, dim: int) -> np.ndarray:
+    # Same as Embedder with EMBEDDING_DIM set: keep the leading dims, renormalize
+    head = matrix[:, :dim]
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    return head / np.where(norms == 0, 1, norms)
+
+
+def top_k(corpus, queries, dim, datatype, k):
+    path = tempfile.mkdtemp(prefix="bench_precision_")
+    try:
+        collection = LocalCollection(path, dim=dim, datatype=datatype)
+        collection.upsert([str(i) for i in range(len(corpus))], corpus, [{} for _ in range(len(corpus))])
+        results = [{row for row, _ in hits} for hits in collection.search(queries, k)]
+        del collection
+        return results
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def ram_per_million(dim: int, datatype: str) -> str:
+    mib = dim * BYTES_PER_VALUE[datatype] * 1_000_000 / 2**20
+    return f"{mib:9.0f} MiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dims", type=int, nargs="+", default=[3072, 1536, 768, 256])
+    parser.add_argument("--datatypes", nargs="+", choices=DATATYPES, default=list(DATATYPES))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--from-qdrant", metavar="COLLECTION")
+    args = parser.parse_args()
+
+    if args.from_qdrant:
+        corpus, queries = from_qdrant(args.from_qdrant, args.points, args.queries)
+    else:
+        corpus, queries = synthetic(args.points, args.queries, max(args.dims))
+    full_dim = corpus.shape[1]
+    dims = [d for d in args.dims if d <= full_dim]
+    if not dims:
+        sys.exit(f"No --dims fit the corpus dimension ({full_dim})")
+    print(f"{len(corpus)} points, {len(queries)} queries, baseline {full_dim}-d float32, top-{args.top_k}")
+
+    baseline = top_k(truncate(corpus, full_dim), truncate(queries, full_dim), full_dim, "float32", args.top_k)
+    print(f"{'dim':>6} {'datatype':<8} {'RAM / 1M vectors':>16} {'overlap@k':>10}")
+    for dim in sorted(dims, reverse=True):
+        corpus_dim, queries_dim = truncate(corpus, dim), truncate(queries, dim)
+        for datatype in args.datatypes:
+            results = top_k(corpus_dim, queries_dim, dim, datatype, args.top_k)
+            overlap = np.mean([len(a & b) / args.top_k for a, b in zip(baseline, results)])
+            print(f"{dim:>6} {datatype:<8} {ram_per_million(dim, datatype):>16} {overlap:>10.3f}")
+    print("RAM excludes payloads and index overhead; Qdrant's uint8 mode keeps the "
+          "float32 originals on disk for rescoring.")
+
+
+if __name__ == "__main__":
+    main()
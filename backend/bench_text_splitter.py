@@ -0,0 +1,102 @@
+"""
+Benchmark the streaming splitter in app/core/text_splitter.py against the two
+splitters it replaced: the old naive character splitter (800/100, transcripts)
+and LangChain's RecursiveCharacterTextSplitter (1000/200, documents).
+
+Usage (from the backend directory):
+    python bench_text_splitter.py --sizes 1 4 16 --repeat 3
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.append(os.getcwd())
+
+from app.core.text_splitter import iter_page_chunks, iter_text_chunks
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog vector search embedding qdrant "
+    "retrieval context answer document chunk overlap sentence paragraph page"
+).split()
+
+
+def legacy_split(text: str, chunk_size: int = 800, chunk_overlap: int = 100) -> List[str]:
+    # Verbatim copy of the previous app/core/text_splitter.split_text_into_chunks
+    text = text.replace("\r", "\n")
+    if not text:
+        return []
+    chunks = []
+    start = 0
+    text_len = len(text)
+    while start < text_len:
+        end = start + chunk_size
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - chunk_overlap
+        if start < 0:
+            start = 0
+    return chunks
+
+
+def make_text(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(5, 30))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        paragraph = " ".join(sentences)
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="input sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        recursive = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, separators=["\n\n", "\n", " ", ""])
+    except ImportError:
+        recursive = None
+        print("langchain_text_splitters not installed; skipping RecursiveCharacterTextSplitter")
+
+    print(f"{'MB':>6} {'splitter':<28} {'seconds':>9} {'MB/s':>8} {'chunks':>8}")
+    for mb in args.sizes:
+        text = make_text(mb)
+        pages = [(page, i) for i, page in enumerate(text[i:i + 3000] for i in range(0, len(text), 3000))]
+        cases = [
+            ("legacy char 800/100", lambda: legacy_split(text)),
+            ("streaming 800/100", lambda: sum(1 for _ in iter_text_chunks(text, 800, 100))),
+            ("streaming 1000/200", lambda: sum(1 for _ in iter_text_chunks(text, 1000, 200))),
+            ("streaming 1000/200 pages", lambda: sum(1 for _ in iter_page_chunks(pages, 1000, 200))),
+            ("streaming 200/40 tokens", lambda: sum(1 for _ in iter_text_chunks(text, 200, 40, unit="token"))),
+        ]
+        if recursive is not None:
+            cases.append(("recursive 1000/200", lambda: recursive.split_text(text)))
+        for name, fn in cases:
+            seconds, result = timed(fn, args.repeat)
+            count = result if isinstance(result, int) else len(result)
+            print(f"{mb:>6.1f} {name:<28} {seconds:>9.3f} {mb / seconds:>8.1f} {count:>8}")
+
+
+if __name__ == "__main__":
+    main()
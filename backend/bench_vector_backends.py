@@ -0,0 +1,192 @@
+"""
+Benchmark the embedded local vector index (app/repository/local_repo.py) against
+a Qdrant server at 10k / 100k / 1M vectors.
+
+Reports build time, single-query latency (p50/p99), batched throughput, the cost
+of a single-point upsert and delete once the collection is full and, for HNSW,
+recall@k against brute force. Points carry chunk-sized payloads (~1 KB of text),
+like the documents collection. The Qdrant run is skipped when no server is
+reachable at QDRANT_HOST:QDRANT_PORT. 1M x 768 float32 needs ~3 GB of RAM/disk;
+use --dim or --sizes to scale down.
+
+Usage (from the backend directory):
+    python bench_vector_backends.py --sizes 10000 100000 1000000 --dim 768
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from app.repository import local_repo
+from app.repository.local_repo import LocalCollection
+
+BATCH = 50000
+PAYLOAD_CHARS = 1000
+WORDS = "policy refund customer account password upload document support invoice the a of to and in".split()
+
+
+def make_payloads(start: int, count: int):
+    # Chunk-like payloads, so payload storage costs show up in build and write times
+    rng = np.random.default_rng(start)
+    payloads = []
+    for i in range(count):
+        words = " ".join(WORDS[j] for j in rng.integers(0, len(WORDS), PAYLOAD_CHARS // 5))
+        payloads.append({
+            "text": words[:PAYLOAD_CHARS], "source": f"doc_{(start + i) // 200}.pdf",
+            "chunk_index": (start + i) % 200, "start": 0, "end": PAYLOAD_CHARS, "page": (start + i) % 200 // 3,
+        })
+    return payloads
+
+
+def clustered(rng, centroids, count):
+    # Real embeddings cluster by topic; uniform Gaussian noise is a pathological
+    # worst case for graph indexes, so sample around a fixed set of centroids
+    picks = rng.integers(0, len(centroids), count)
+    return centroids[picks] + 0.35 * rng.standard_normal((count, centroids.shape[1]), dtype=np.float32)
+
+
+def make_centroids(dim: int, clusters: int = 512):
+    return np.random.default_rng(42).standard_normal((clusters, dim), dtype=np.float32)
+
+
+def vector_batches(n: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centroids = make_centroids(dim)
+    for start in range(0, n, BATCH):
+        yield start, clustered(rng, centroids, min(BATCH, n - start))
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return f"p50={np.percentile(values, 50):7.2f}ms p99={np.percentile(values, 99):7.2f}ms"
+
+
+def time_queries(search_one, search_many, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search_one(query)
+        latencies.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    search_many(queries)
+    batch_seconds = time.perf_counter() - started
+    return percentiles(latencies), len(queries) / batch_seconds
+
+
+def time_writes(collection, vector, repeat: int = 20):
+    # One-point upsert + delete on a full collection, as upsert_chat/delete_chat do
+    upserts, deletes = [], []
+    for i in range(repeat):
+        started = time.perf_counter()
+        collection.upsert([f"write-{i}"], [vector], make_payloads(i, 1))
+        upserts.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        collection.delete([f"write-{i}"])
+        deletes.append(time.perf_counter() - started)
+    return f"upsert1 {percentiles(upserts)} delete1 {percentiles(deletes)}"
+
+
+def bench_local(n, dim, queries, k, use_hnsw):
+    path = tempfile.mkdtemp(prefix="bench_local_")
+    try:
+        local_repo.LOCAL_INDEX_HNSW_MIN = 0
+        collection = LocalCollection(path, dim=dim, use_hnsw=use_hnsw)
+        started = time.perf_counter()
+        for start, vectors in vector_batches(n, dim):
+            collection.upsert([str(start + i) for i in range(len(vectors))], vectors, make_payloads(start, len(vectors)))
+        collection.search(queries[:1], k)  # builds the HNSW graph when enabled
+        build = time.perf_counter() - started
+        latency, qps = time_queries(lambda q: collection.search([q], k), lambda qs: collection.search(qs, k), queries)
+        writes = time_writes(collection, queries[0])
+        return collection, build, latency, qps, writes, path
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+
+def bench_qdrant(client, n, dim, queries, k):
+    from qdrant_client.http import models as rest
+
+    name = f"bench_{n}_{dim}"
+    client.recreate_collection(collection_name=name, vectors_config=rest.VectorParams(size=dim, distance=rest.Distance.COSINE))
+    started = time.perf_counter()
+    for start, vectors in vector_batches(n, dim):
+        client.upload_collection(
+            collection_name=name, vectors=vectors, payload=make_payloads(start, len(vectors)),
+            ids=range(start, start + len(vectors)), wait=True,
+        )
+    build = time.perf_counter() - started
+
+    def one(q):
+        return client.query_points(collection_name=name, query=q.tolist(), limit=k)
+
+    def many(qs):
+        return client.query_batch_points(
+            collection_name=name, requests=[rest.QueryRequest(query=q.tolist(), limit=k) for q in qs]
+        )
+
+    try:
+        latency, qps = time_queries(one, many, queries)
+    finally:
+        client.delete_collection(collection_name=name)
+    return build, latency, qps
+
+
+def qdrant_client_or_none():
+    try:
+        from qdrant_client import QdrantClient
+
+        host = os.getenv("QDRANT_HOST", "localhost")
+        port = int(os.getenv("QDRANT_PORT", 6333))
+        client = QdrantClient(url=f"http://{host}:{port}", timeout=120)
+        client.get_collections()
+        return client
+    except Exception as e:
+        print(f"Qdrant not reachable ({e}); skipping Qdrant backend")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--skip-qdrant", action="store_true")
+    args = parser.parse_args()
+
+    queries = clustered(np.random.default_rng(1), make_centroids(args.dim), args.queries)
+    client = None if args.skip_qdrant else qdrant_client_or_none()
+    variants = [False] + ([True] if local_repo.hnswlib is not None else [])
+    if local_repo.hnswlib is None:
+        print("hnswlib not installed; skipping local HNSW")
+
+    for n in args.sizes:
+        exact = None
+        for use_hnsw in variants:
+            collection, build, latency, qps, writes, path = bench_local(n, args.dim, queries, args.top_k, use_hnsw)
+            label = "local hnsw" if use_hnsw else "local brute-force"
+            line = f"{n:>8} {label:<18} build={build:7.2f}s {latency} batch={qps:8.1f} q/s {writes}"
+            results = [{row for row, _ in hits} for hits in collection.search(queries, args.top_k)]
+            if exact is None:
+                exact = results
+            else:
+                recall = np.mean([len(a & b) / args.top_k for a, b in zip(exact, results)])
+                line += f" recall@{args.top_k}={recall:.3f}"
+            print(line)
+            collection.close()
+            del collection
+            shutil.rmtree(path, ignore_errors=True)
+        if client is not None:
+            build, latency, qps = bench_qdrant(client, n, args.dim, queries, args.top_k)
+            print(f"{n:>8} {'qdrant':<18} build={build:7.2f}s {latency} batch={qps:8.1f} q/s")
+
+
+if __name__ == "__main__":
+    main()
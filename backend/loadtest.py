@@ -0,0 +1,351 @@
+"""
+Headless load test for the backend.
+
+Starts the FastAPI app from main.py under uvicorn with local stand-ins for the
+external services: a fake embedder and LLM with configurable latency, a fake
+transcriber, and embedded Qdrant (":memory:") or the local vector backend. Then
+drives mixed traffic (chat, history listing, uploads, transcription) at a fixed
+concurrency (closed loop) or a target request rate (open loop), and reports
+throughput and p50/p95/p99 latency per endpoint as JSON.
+
+Usage (from the backend directory):
+    python loadtest.py --concurrency 32 --duration 30 --output run.json
+    python loadtest.py --rate 50 --duration 30 --llm-latency 800 --baseline run.json
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(os.getcwd())
+
+POPULAR_QUERIES = [
+    "What is the refund policy?",
+    "How do I reset my password?",
+    "Which file formats can I upload?",
+    "Who do I contact for support?",
+]
+
+
+class FakeEmbedder:
+    """
+    Deterministic hash-based vectors after a configurable delay.
+    """
+
+    def __init__(self, dim: int, latency_ms: float, jitter: float):
+        self.model_name = "fake-embedder"
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+
+    @property
+    def embedding_dim(self) -> int:
+        return self.dim
+
+    def _sleep(self):
+        time.sleep(_jittered(self.latency_ms, self.jitter) / 1000)
+
+    def _vector(self, text: str) -> List[float]:
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._sleep()
+        return [self._vector(t) for t in texts]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._sleep()
+        return self._vector(text)
+
+
+def _jittered(latency_ms: float, jitter: float) -> float:
+    return max(0.0, random.gauss(latency_ms, latency_ms * jitter))
+
+
+def install_stand_ins(args):
+    """
+    Configure local backends and swap the external services for fakes before
+    the app is imported and started.
+    """
+    os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+    os.environ["EMBEDDING_DIM"] = str(args.dim)
+    if args.backend == "qdrant-memory":
+        os.environ["VECTOR_BACKEND"] = "qdrant"
+        os.environ["QDRANT_LOCATION"] = ":memory:"
+    elif args.backend == "local":
+        import tempfile
+        os.environ["VECTOR_BACKEND"] = "local"
+        os.environ["LOCAL_INDEX_PATH"] = tempfile.mkdtemp(prefix="loadtest_index_")
+    else:
+        os.environ["VECTOR_BACKEND"] = "qdrant"  # QDRANT_HOST/QDRANT_PORT server
+
+    import app.services.chat_service as chat_service
+    import app.services.ingestion_service as ingestion_service
+
+    embedder = FakeEmbedder(args.dim, args.embed_latency, args.jitter)
+    chat_service.EMBEDDER = embedder
+    ingestion_service.EMBEDDER = embedder
+
+    def fake_synthesize_answer(query, contexts, timeout=None):
+        time.sleep(_jittered(args.llm_latency, args.jitter) / 1000)
+        if not contexts:
+            return "I could not find relevant information in the ingested documents."
+        return f"Stub answer to '{query}' from {len(contexts)} contexts."
+
+    async def fake_transcribe_audio(file):
+        await file.read()
+        await asyncio.sleep(_jittered(args.transcribe_latency, args.jitter) / 1000)
+        return "stub transcription of the uploaded audio"
+
+    chat_service.synthesize_answer = fake_synthesize_answer
+    ingestion_service.transcribe_audio = fake_transcribe_audio
+
+
+def start_server(port: int):
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_document(rng: random.Random) -> bytes:
+    sentences = [f"Section {rng.randint(1, 50)} explains topic {rng.randint(1, 500)} in detail." for _ in range(rng.randint(20, 120))]
+    return " ".join(sentences).encode("utf-8")
+
+
+async def call(client, endpoint: str, rng: random.Random):
+    if endpoint == "chat":
+        if rng.random() < 0.5:
+            query = rng.choice(POPULAR_QUERIES)
+        else:
+            query = f"Tell me about topic {rng.randint(1, 10000)}"
+        return await client.post("/api/chat/", json={"query": query, "top_k": 5})
+    if endpoint == "history":
+        return await client.get("/api/chat/history")
+    if endpoint == "upload":
+        name = f"doc_{rng.randint(1, 20)}.txt"
+        return await client.post("/api/upload/document", files={"file": (name, make_document(rng), "text/plain")})
+    if endpoint == "transcribe":
+        return await client.post("/api/chat/transcribe", files={"file": ("voice.webm", os.urandom(4096), "audio/webm")})
+    raise ValueError(endpoint)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def timed(self, client, endpoint: str, rng: random.Random):
+        started = time.perf_counter()
+        try:
+            response = await call(client, endpoint, rng)
+            status = str(response.status_code)
+        except Exception as e:
+            status = type(e).__name__
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][status] += 1
+
+
+def pick(rng: random.Random, mix: Dict[str, float]) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+async def closed_loop(client, recorder, mix, concurrency, duration, seed):
+    deadline = time.monotonic() + duration
+
+    async def worker(n):
+        rng = random.Random(seed + n)
+        while time.monotonic() < deadline:
+            await recorder.timed(client, pick(rng, mix), rng)
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+
+
+async def open_loop(client, recorder, mix, rate, duration, seed, max_outstanding):
+    rng = random.Random(seed)
+    deadline = time.monotonic() + duration
+    tasks = set()
+    while time.monotonic() < deadline:
+        if len(tasks) < max_outstanding:
+            task = asyncio.ensure_future(recorder.timed(client, pick(rng, mix), random.Random(rng.random())))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        else:
+            recorder.statuses["driver"]["dropped"] += 1
+        # Poisson arrivals at the target rate
+        await asyncio.sleep(rng.expovariate(rate))
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict]:
+    endpoints = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        statuses = dict(recorder.statuses[endpoint])
+        ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "ok": ok,
+            "errors": len(values) - ok,
+            "status": statuses,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(1000 * sum(values) / len(values), 2),
+            "p50_ms": round(1000 * percentile(values, 50), 2),
+            "p95_ms": round(1000 * percentile(values, 95), 2),
+            "p99_ms": round(1000 * percentile(values, 99), 2),
+        }
+    return endpoints
+
+
+def compare(report: Dict, baseline_path: str) -> Dict[str, Dict]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    deltas = {}
+    for endpoint, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        deltas[endpoint] = {
+            key: round(100 * (current[key] - previous[key]) / previous[key], 1) if previous[key] else None
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+    return deltas
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"chat", "history", "upload", "transcribe"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=16, help="closed loop: number of concurrent clients")
+    load.add_argument("--rate", type=float, help="open loop: target requests per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unmeasured traffic first")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("chat=60,history=20,upload=10,transcribe=10"))
+    parser.add_argument("--max-outstanding", type=int, default=1000, help="open loop: cap on in-flight requests")
+    parser.add_argument("--embed-latency", type=float, default=80, help="fake embedder latency (ms)")
+    parser.add_argument("--llm-latency", type=float, default=600, help="fake LLM latency (ms)")
+    parser.add_argument("--transcribe-latency", type=float, default=400, help="fake transcription latency (ms)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency stddev as a fraction of the mean")
+    parser.add_argument("--dim", type=int, default=768, help="fake embedding size")
+    parser.add_argument("--backend", choices=["qdrant-memory", "local", "qdrant"], default="qdrant-memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the server's own output")
+    args = parser.parse_args()
+
+    import httpx
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        install_stand_ins(args)
+        port = free_port()
+        server, thread = start_server(port)
+
+        async def run():
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+                # Seed a few documents so chat has something to retrieve
+                seed_rng = random.Random(args.seed)
+                for _ in range(5):
+                    await call(client, "upload", seed_rng)
+                for phase, seconds in (("warmup", args.warmup), ("measure", args.duration)):
+                    if seconds <= 0:
+                        continue
+                    recorder = Recorder()
+                    started = time.monotonic()
+                    if args.rate:
+                        await open_loop(client, recorder, args.mix, args.rate, seconds, args.seed, args.max_outstanding)
+                    else:
+                        await closed_loop(client, recorder, args.mix, args.concurrency, seconds, args.seed)
+                    elapsed = time.monotonic() - started
+                stats = (await client.get("/api/chat/stats")).json()
+                admission = (await client.get("/api/health/admission")).json()
+                return recorder, elapsed, stats, admission
+
+        recorder, elapsed, stats, admission = asyncio.run(run())
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    all_latencies = sorted(v for values in recorder.latencies.values() for v in values)
+    report = {
+        "config": {
+            "mode": "open" if args.rate else "closed",
+            "rate": args.rate,
+            "concurrency": None if args.rate else args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "embed_latency_ms": args.embed_latency,
+            "llm_latency_ms": args.llm_latency,
+            "transcribe_latency_ms": args.transcribe_latency,
+            "jitter": args.jitter,
+            "backend": args.backend,
+            "dim": args.dim,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total": {
+            "requests": len(all_latencies),
+            "throughput_rps": round(len(all_latencies) / elapsed, 2),
+            "p50_ms": round(1000 * percentile(all_latencies, 50), 2),
+            "p99_ms": round(1000 * percentile(all_latencies, 99), 2),
+        },
+        "endpoints": summarize(recorder, elapsed),
+        "driver": dict(recorder.statuses.get("driver", {})),
+        "server": {"chat": stats, "admission": admission.get("lanes", {})},
+    }
+    if args.baseline:
+        report["baseline_delta_pct"] = compare(report, args.baseline)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,72 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from app.core.admission import AdmissionMiddleware
+from app.core.embeddings import EmbeddingDimMismatch
+from app.repository.factory import get_repository
 
 # Import routers from layered modules
 from app.routes.health_routes import router as health_router
 from app.routes.upload_routes import router as upload_router
 from app.routes.chat_routes import router as chat_router
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, several times faster than the stdlib
+    encoder (fastapi.responses.ORJSONResponse is deprecated in recent FastAPI).
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+DEFAULT_RESPONSE_CLASS = FastJSONResponse if orjson is not None else JSONResponse
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Refuse to start on collections built with another EMBEDDING_DIM rather than
+    # serving empty searches and recreating (wiping) them on the next upload
+    try:
+        get_repository().verify_vector_collections()
+    except EmbeddingDimMismatch:
+        raise
+    except Exception as e:
+        # Qdrant may still be starting; writes and re-ingestion check again lazily
+        print(f"WARNING: could not verify vector collections at startup: {e}")
+    yield
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Secure Self-Hosted Chatbot - Backend (Layered Architecture)")
+    app = FastAPI(
+        title="Secure Self-Hosted Chatbot - Backend (Layered Architecture)",
+        default_response_class=DEFAULT_RESPONSE_CLASS,
+        lifespan=lifespan,
+    )
+
+    # Compression for large payloads: brotli when available (falls back to gzip
+    # for clients that don't accept br), otherwise gzip only
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+    # Admission control - per-lane concurrency limits with fast 429/503 rejections.
+    # Added before CORS so rejections still carry CORS headers.
+    app.add_middleware(AdmissionMiddleware)
 
     # CORS - allow local dev from frontend
     app.add_middleware(
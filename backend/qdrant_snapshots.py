@@ -0,0 +1,246 @@
+"""
+Snapshot export/import for the backend's Qdrant collections (documents, chats,
+conversations, folders), for bootstrapping a new replica or recovering without
+re-embedding the corpus.
+
+Snapshots are created through Qdrant's snapshot API. Downloads and uploads are
+streamed in chunks, so multi-GB snapshots never sit in memory. `download` writes
+a manifest.json next to the snapshot files with each collection's exact point
+count, vector/quantization config and file checksum; for an existing --snapshot
+these are read from a temporary scratch collection restored from it. `restore`
+uploads the files (checksum-verified by Qdrant) and then checks the restored
+collections against that manifest, exiting non-zero on any mismatch.
+
+Usage (from the backend directory):
+    python qdrant_snapshots.py list
+    python qdrant_snapshots.py create --collections documents
+    python qdrant_snapshots.py download --out snapshots/2026-10-19
+    python qdrant_snapshots.py download --collections chats --snapshot chats-123.snapshot --out snapshots/chats
+    python qdrant_snapshots.py restore --from snapshots/2026-10-19
+    python qdrant_snapshots.py verify --from snapshots/2026-10-19
+    python qdrant_snapshots.py delete --collections chats --snapshot chats-123.snapshot
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from urllib.parse import quote
+
+import httpx
+from qdrant_client import QdrantClient
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+COLLECTIONS = ["documents", "chats", "conversations", "folders"]
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 1024 * 1024
+# Snapshot transfers can take minutes; only the connect phase gets a short timeout
+TRANSFER_TIMEOUT = httpx.Timeout(None, connect=10.0)
+
+
+def _dump(model):
+    if model is None:
+        return None
+    if hasattr(model, "model_dump"):
+        return model.model_dump(mode="json", exclude_none=True)
+    return json.loads(model.json(exclude_none=True))
+
+
+def collection_state(client: QdrantClient, name: str):
+    """
+    What a restore must reproduce: exact point count and vector storage config.
+    """
+    info = client.get_collection(collection_name=name)
+    return {
+        "points_count": client.count(collection_name=name, exact=True).count,
+        "vectors": _dump(info.config.params.vectors),
+        "quantization": _dump(info.config.quantization_config),
+    }
+
+
+def existing_collections(client: QdrantClient, names):
+    present = {c.name for c in client.get_collections().collections}
+    missing = [name for name in names if name not in present]
+    if missing:
+        print(f"Skipping missing collections: {', '.join(missing)}")
+    return [name for name in names if name in present]
+
+
+def _snapshot_url(base_url: str, collection: str, snapshot: str = None) -> str:
+    url = f"{base_url}/collections/{quote(collection)}/snapshots"
+    return f"{url}/{quote(snapshot)}" if snapshot else url
+
+
+def download_snapshot(base_url: str, collection: str, snapshot: str, path: str):
+    # Stream to a temp file and rename, so an interrupted transfer never looks complete
+    digest = hashlib.sha256()
+    size = 0
+    partial = path + ".part"
+    with httpx.stream("GET", _snapshot_url(base_url, collection, snapshot), timeout=TRANSFER_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(partial, "wb") as f:
+            for chunk in response.iter_bytes(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    os.replace(partial, path)
+    return digest.hexdigest(), size
+
+
+def upload_snapshot(base_url: str, collection: str, path: str, checksum: str = None):
+    # httpx streams file objects in multipart bodies chunk by chunk.
+    # priority=snapshot makes the uploaded data win over any existing points.
+    params = {"priority": "snapshot", "wait": "true"}
+    if checksum:
+        params["checksum"] = checksum
+    with open(path, "rb") as f:
+        response = httpx.post(
+            f"{_snapshot_url(base_url, collection)}/upload",
+            params=params,
+            files={"snapshot": (os.path.basename(path), f, "application/octet-stream")},
+            timeout=TRANSFER_TIMEOUT,
+        )
+    response.raise_for_status()
+
+
+def verify(client: QdrantClient, manifest) -> bool:
+    ok = True
+    for name, expected in manifest["collections"].items():
+        try:
+            actual = collection_state(client, name)
+        except Exception as e:
+            print(f"FAIL {name}: {e}")
+            ok = False
+            continue
+        problems = [
+            f"{key}: expected {expected[key]!r}, got {actual[key]!r}"
+            for key in ("points_count", "vectors", "quantization")
+            if expected[key] != actual[key]
+        ]
+        if problems:
+            ok = False
+            print(f"FAIL {name}: " + "; ".join(problems))
+        else:
+            print(f"OK   {name}: {actual['points_count']} points")
+    return ok
+
+
+def snapshot_state(client: QdrantClient, base_url: str, collection: str, path: str, checksum: str):
+    """
+    State of an existing snapshot file, which may differ from the live collection:
+    restore it into a temporary scratch collection and read it there.
+    """
+    scratch = f"{collection}__manifest_{int(time.time())}"
+    try:
+        upload_snapshot(base_url, scratch, path, checksum)
+        return collection_state(client, scratch)
+    finally:
+        client.delete_collection(collection_name=scratch)
+
+
+def cmd_list(client, base_url, args):
+    for name in existing_collections(client, args.collections):
+        snapshots = client.list_snapshots(collection_name=name)
+        print(f"{name}: {len(snapshots)} snapshot(s)")
+        for s in sorted(snapshots, key=lambda s: s.creation_time or ""):
+            print(f"  {s.name}  {s.size / 2**20:10.1f} MiB  {s.creation_time}")
+
+
+def cmd_create(client, base_url, args):
+    for name in existing_collections(client, args.collections):
+        started = time.perf_counter()
+        snapshot = client.create_snapshot(collection_name=name, wait=True)
+        print(f"{name}: created {snapshot.name} ({snapshot.size / 2**20:.1f} MiB) in {time.perf_counter() - started:.1f}s")
+
+
+def cmd_download(client, base_url, args):
+    os.makedirs(args.out, exist_ok=True)
+    manifest = {"created_at": time.time(), "source": base_url, "collections": {}}
+    for name in existing_collections(client, args.collections):
+        # Record the state before snapshotting; a write in between shows up as a
+        # count mismatch on verify instead of going unnoticed
+        state = None if args.snapshot else collection_state(client, name)
+        snapshot = args.snapshot or client.create_snapshot(collection_name=name, wait=True).name
+        path = os.path.join(args.out, f"{name}.snapshot")
+        started = time.perf_counter()
+        checksum, size = download_snapshot(base_url, name, snapshot, path)
+        print(f"{name}: downloaded {snapshot} ({size / 2**20:.1f} MiB) in {time.perf_counter() - started:.1f}s")
+        if args.snapshot:
+            # An older snapshot need not match the live collection
+            started = time.perf_counter()
+            state = snapshot_state(client, base_url, name, path, checksum)
+            print(f"{name}: read {snapshot} state in a scratch collection in {time.perf_counter() - started:.1f}s")
+        elif not args.keep_remote:
+            client.delete_snapshot(collection_name=name, snapshot_name=snapshot, wait=True)
+        manifest["collections"][name] = {"file": os.path.basename(path), "sha256": checksum, "size": size, **state}
+    with open(os.path.join(args.out, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest written to {os.path.join(args.out, MANIFEST)}")
+
+
+def _load_manifest(directory: str, collections):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest["collections"] = {name: entry for name, entry in manifest["collections"].items() if name in collections}
+    return manifest
+
+
+def cmd_restore(client, base_url, args):
+    manifest = _load_manifest(args.source, args.collections)
+    for name, entry in manifest["collections"].items():
+        started = time.perf_counter()
+        upload_snapshot(base_url, name, os.path.join(args.source, entry["file"]), entry.get("sha256"))
+        print(f"{name}: restored {entry['file']} ({entry['size'] / 2**20:.1f} MiB) in {time.perf_counter() - started:.1f}s")
+    if not verify(client, manifest):
+        sys.exit(1)
+
+
+def cmd_verify(client, base_url, args):
+    if not verify(client, _load_manifest(args.source, args.collections)):
+        sys.exit(1)
+
+
+def cmd_delete(client, base_url, args):
+    for name in existing_collections(client, args.collections):
+        client.delete_snapshot(collection_name=name, snapshot_name=args.snapshot, wait=True)
+        print(f"{name}: deleted {args.snapshot}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=f"http://{QDRANT_HOST}:{QDRANT_PORT}")
+    # Per subcommand, so a multi-value --collections cannot swallow the command name
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument("--collections", nargs="+", default=COLLECTIONS)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", parents=[selection], help="list snapshots stored on the server")
+    commands.add_parser("create", parents=[selection], help="create server-side snapshots")
+    download = commands.add_parser("download", parents=[selection], help="snapshot and stream to a local directory with a manifest")
+    download.add_argument("--out", required=True)
+    download.add_argument("--snapshot", help="download this existing snapshot instead of creating one "
+                          "(its manifest state is read from a temporary scratch restore)")
+    download.add_argument("--keep-remote", action="store_true", help="keep the snapshot created for the download on the server")
+    restore = commands.add_parser("restore", parents=[selection], help="upload snapshots from a directory, then verify")
+    restore.add_argument("--from", dest="source", required=True)
+    check = commands.add_parser("verify", parents=[selection], help="compare live collections against a manifest")
+    check.add_argument("--from", dest="source", required=True)
+    delete = commands.add_parser("delete", parents=[selection], help="delete a server-side snapshot")
+    delete.add_argument("--snapshot", required=True)
+    args = parser.parse_args()
+    # Snapshot names are per collection (e.g. "chats-<id>-<time>.snapshot")
+    if getattr(args, "snapshot", None) and len(args.collections) != 1:
+        parser.error("--snapshot names one collection's snapshot; pass exactly one collection with --collections")
+
+    base_url = args.url.rstrip("/")
+    client = QdrantClient(url=base_url, timeout=300)
+    handlers = {
+        "list": cmd_list, "create": cmd_create, "download": cmd_download,
+        "restore": cmd_restore, "verify": cmd_verify, "delete": cmd_delete,
+    }
+    handlers[args.command](client, base_url, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -193,7 +193,7 @@ export default function Home() {
     try {
       const res = await fetch(`${backend}/api/upload/document`, { method: "POST", body: form });
       const data = await res.json();
-      setMessages(prev => [...prev, { role: "system", text: `Processed ${data.inserted} chunks.` }]);
+      setMessages(prev => [...prev, { role: "system", text: `Processed ${data.chunks} chunks (${data.inserted} new).` }]);
     } catch (err) {
       setMessages(prev => [...prev, { role: "system", text: "Upload failed." }]);
     }